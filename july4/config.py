@@ -1,14 +1,30 @@
 import json
 import re
+from scheduler import policies
 
 config = {
   'colors': [(0,0,0)],
+  'gradient': 'none',
   'spread': 1,
   'space_between': 1,
   'crawl': 1,
   'fade': 1,
+  'decay': 128,
   'period_ms': 250,
+  'policy': 'skip',
   'random': 5,
+  'seed': 0,
+  'profile': 0,
+  'pipeline': 0,
+  'gamma': 22,
+  'brightness': 255,
+  'max_ma': 0,
+  'segments': [],
+  'play': '',
+  'record': '',
+  'record_frames': 600,
+  'udp_port': 0,
+  'transition_ms': 0,
 }
 
 def to_color_tuples(hex_colors):
@@ -30,14 +46,68 @@ def to_hex_colors(color_tuples:tuple[int,int,int]):
     hex_colors[i] = '#%02x%02x%02x' % color_tuples[i]
   return hex_colors
 
+def to_policy(policy):
+  return policy if policy in policies else None
+
+gradients = ('none', 'linear', 'hsv')
+
+def to_gradient(gradient):
+  return gradient if gradient in gradients else None
+
+def to_recording(name):
+  """ a .led file in the app directory, '' for none """
+  if isinstance(name, str) and (name == '' or re.match(r'^[A-Za-z0-9_-]+\.led$', name)):
+    return name
+  return None
+
+_max_segments = 8
+_segment_fixers = {
+  'pin': (0, 29),
+  'nleds': (1, 5000),
+  'offset': (0, 100000),
+}
+
+def to_segments(segments):
+  """ segments need a pin and nleds, other keys override the effect settings """
+  if not isinstance(segments, list):
+    return None
+  fixed = []
+  for seg in segments[:_max_segments]:
+    if not isinstance(seg, dict) or not isinstance(seg.get('pin'), int) or not isinstance(seg.get('nleds'), int):
+      continue
+    seg.pop('segments', None)
+    seg = _fix(seg)
+    for key, (lo, hi) in _segment_fixers.items():
+      if isinstance(seg.get(key), int):
+        seg[key] = min(max(seg[key], lo), hi)
+      elif key in seg:
+        del seg[key]
+    fixed.append(seg)
+  return fixed
+
 _fixers = {
   'colors': to_color_tuples,
+  'gradient': to_gradient,
   'spread': (1,50),
   'space_between': (0,50),
-  'crawl': (-1,1),
+  'crawl': (-50,50),
   'fade': (0,1),
+  'decay': (0,255),
   'period_ms': (10, 5000),
+  'policy': to_policy,
   'random': (0, 100),
+  'seed': (0, 0x7fffffff),
+  'profile': (0,1),
+  'pipeline': (0,1),
+  'gamma': (10,30),
+  'brightness': (0,255),
+  'max_ma': (0, 100000),
+  'segments': to_segments,
+  'play': to_recording,
+  'record': to_recording,
+  'record_frames': (1, 100000),
+  'udp_port': (0, 65535),
+  'transition_ms': (0, 10000),
 }
 
 def _fix(cfg):
@@ -74,12 +144,30 @@ def load():
   except:
     return False
 
+def to_json(cfg):
+  """ copy of cfg with hex colors, as sent to and read back from the frontend """
+  cfg = cfg.copy()
+  if 'colors' in cfg:
+    cfg['colors'] = to_hex_colors(cfg['colors'])
+  if 'segments' in cfg:
+    cfg['segments'] = [to_json(seg) for seg in cfg['segments']]
+  return cfg
+
+# acted on when set, a reboot must not do them again
+_one_shot = ('record',)
+
+def _saved(cfg):
+  """ cfg less the one shot keys, as written to config.json and kept in scenes """
+  cfg = {key: value for key, value in cfg.items() if key not in _one_shot}
+  if 'segments' in cfg:
+    cfg['segments'] = [_saved(seg) for seg in cfg['segments']]
+  return cfg
+
 def write():
-  cfg = config.copy()
-  cfg['colors'] = to_hex_colors(cfg['colors'])
+  cfg = to_json(config)
   try:
     with open("config.json", "w") as f:
-      f.write(json.dumps(cfg))
+      f.write(json.dumps(_saved(cfg)))
   except:
     pass
   return cfg
@@ -0,0 +1,165 @@
+"""
+DDP pixel stream receiver (http://www.3waylabs.com/ddp/). A sender on
+the network splits each frame into UDP packets of pixel data at byte
+offsets into the strip and flags the last one push. poll() drains the
+socket through one preallocated packet buffer into the strip's buffer.
+
+  header  flags:u8 seq:u8 type:u8 id:u8 offset:u32 length:u16 (big endian)
+          then a u32 timecode if flags has TIMECODE
+  data    length bytes of RGB (RGBW on a 4 byte strip), pixel order
+"""
+import select
+import socket
+import time
+
+PORT = 4048
+
+_VERSION_MASK = 0xc0
+_VERSION_1 = 0x40
+_TIMECODE = 0x10
+_QUERY = 0x02
+_PUSH = 0x01
+_header_size = 10
+# 480 RGB pixels, what senders put in a packet
+_max_data = 1440
+# per poll, so a flood of packets cannot stall the LED thread
+_max_packets = 64
+# stale packets in a row before taking the sender's sequence as restarted
+_max_stale = 4
+
+try:
+  @micropython.viper
+  def _put(buf, pkt, start:int, count:int, offset:int, size:int, bpp:int, order, lut):
+    # count bytes of stream data at offset into buf through lut, reordered per pixel
+    b = ptr8(buf)
+    p = ptr8(pkt)
+    o = ptr8(order)
+    t = ptr8(lut)
+    k = offset % bpp
+    i = offset - k
+    for j in range(start, start + count):
+      if i >= size:
+        break
+      b[i + o[k]] = t[p[j]]
+      k += 1
+      if k >= bpp:
+        k = 0
+        i += bpp
+except (NameError, AttributeError):
+  # no viper emitter (CPython)
+  def _put(buf, pkt, start, count, offset, size, bpp, order, lut):
+    for j in range(count):
+      q = offset + j
+      i = q - q % bpp
+      if i >= size:
+        break
+      buf[i + order[q - i]] = lut[pkt[start + j]]
+
+class Receiver(object):
+  """
+  Non-blocking DDP listener, polled once per tick from the LED thread.
+  Counts packets, pushed frames, packets lost to gaps in the sequence
+  numbers and stale packets arriving after newer ones, which are dropped.
+  """
+
+  def __init__(self, port=PORT, clock=time):
+    self.port = port
+    self.clock = clock
+    self.sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    self.sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    self.sock.bind(('0.0.0.0', port))
+    self.sock.setblocking(False)
+    self._recv = self.sock.recv_into if hasattr(self.sock, 'recv_into') else self.sock.readinto
+    self._poll = select.poll()
+    self._poll.register(self.sock, select.POLLIN)
+    # ipoll reuses its result, poll builds a list
+    self._ready = self._poll.ipoll if hasattr(self._poll, 'ipoll') else self._poll.poll
+    self.pkt = bytearray(_header_size + 4 + _max_data)
+    self.packets = 0
+    self.frames = 0
+    self.dropped = 0
+    self.out_of_order = 0
+    self.bad = 0
+    self.pps = 0
+    self.fps = 0
+    self._seq = 0
+    self._stale = 0
+    self._window_ms = clock.ticks_ms()
+    self._window_packets = 0
+    self._window_frames = 0
+
+  def _pending(self):
+    for _ in self._ready(0):
+      return True
+    return False
+
+  def poll(self, buf, n, bpp, order, lut):
+    """ waiting packets into buf, n pixels of bpp bytes in order and each byte through lut, True if a frame was pushed """
+    pushed = False
+    for _ in range(_max_packets):
+      if not self._pending():
+        break
+      if self._packet(buf, n * bpp, bpp, order, lut, self._recv(self.pkt)):
+        pushed = True
+        self.frames += 1
+    self._rates()
+    return pushed
+
+  def _packet(self, buf, size, bpp, order, lut, length):
+    p = self.pkt
+    if length < _header_size or p[0] & _VERSION_MASK != _VERSION_1:
+      self.bad += 1
+      return False
+    # queries and other destinations (config, status, dmx) carry no pixels
+    if p[0] & _QUERY or p[3] > 1:
+      return False
+    self.packets += 1
+    seq = p[1] & 0x0f
+    if seq and self._seq:
+      gap = (seq - self._seq - 1) % 15
+      if gap >= 8 and self._stale < _max_stale:
+        self._stale += 1
+        self.out_of_order += 1
+        return False
+      if gap < 8:
+        self.dropped += gap
+    self._stale = 0
+    self._seq = seq
+    start = _header_size + 4 if p[0] & _TIMECODE else _header_size
+    count = p[8] << 8 | p[9]
+    if start + count > length:
+      self.bad += 1
+      return False
+    offset = p[4] << 24 | p[5] << 16 | p[6] << 8 | p[7]
+    if offset >= size:
+      # past the strip, and past 2**31 _put would take it as negative and write before buf
+      self.bad += 1
+      return False
+    _put(buf, p, start, min(count, size - offset), offset, size, bpp, order, lut)
+    return p[0] & _PUSH != 0
+
+  def _rates(self):
+    now = self.clock.ticks_ms()
+    ms = self.clock.ticks_diff(now, self._window_ms)
+    if ms >= 1000:
+      self.pps = (self.packets - self._window_packets) * 1000 // ms
+      self.fps = (self.frames - self._window_frames) * 1000 // ms
+      self._window_ms = now
+      self._window_packets = self.packets
+      self._window_frames = self.frames
+
+  def metrics(self):
+    return {
+      'port': self.port,
+      'packets': self.packets,
+      'frames': self.frames,
+      'packets_per_s': self.pps,
+      'frames_per_s': self.fps,
+      'dropped': self.dropped,
+      'out_of_order': self.out_of_order,
+      'bad': self.bad,
+    }
+
+  def close(self):
+    self._poll.unregister(self.sock)
+    self.sock.close()
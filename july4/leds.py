@@ -3,6 +3,11 @@ import machine
 import _thread
 import time
 import random
+import array
+from scheduler import Scheduler
+import profiler
+import frames
+import ddp
 
 black = (0, 0, 0)
 white = (255, 255, 255)
@@ -25,10 +30,119 @@ xmas_alt = [red, blue, orange, green, yellow]
 
 _default_nleds = 1200
 _default_pin = 0
+_max_crawl = 50
+_idle_ms = 50
+# WS2812 draw estimate: per channel at full on, and per pixel when dark
+_channel_ma = 20
+_idle_ma = 1
+
+class Snapshot(object):
+  """
+  Pre-resolved copy of the config for the LED thread, treated as
+  immutable once built. Leds.publish() builds it on the caller's thread,
+  derived data included, and tick() picks it up at the next frame.
+  Derived data is shared with the previous snapshot when its inputs
+  have not changed.
+  """
+  __slots__ = ('colors', 'gradient', 'spread', 'space_between', 'crawl', 'fade', 'decay',
+    'period_ms', 'policy', 'random', 'seed', 'profile', 'gamma', 'brightness',
+    'max_ma', 'offset', 'play', 'record', 'record_frames', 'udp_port',
+    'transition_ms', 'output_lut', 'palette', 'template', 'decay_lut', 'sparkles')
+
+  def __init__(self, l, config, prev=None):
+    colors = config.get('colors')
+    self.colors = [colors] if isinstance(colors, tuple) else colors
+    self.gradient = config.get('gradient', 'none')
+    self.spread = config.get('spread', 1)
+    self.space_between = config.get('space_between', 0)
+    self.crawl = config.get('crawl', 0)
+    self.fade = config.get('fade', 0)
+    self.decay = config.get('decay', 128)
+    self.period_ms = config.get('period_ms', 250)
+    self.policy = config.get('policy', 'skip')
+    self.random = config.get('random', 0)
+    self.seed = config.get('seed', 0)
+    self.profile = config.get('profile', 0)
+    self.gamma = config.get('gamma', 22)
+    self.brightness = config.get('brightness', 255)
+    self.max_ma = config.get('max_ma', 0)
+    self.offset = config.get('offset', 0)
+    self.play = config.get('play', '')
+    self.record = config.get('record', '')
+    self.record_frames = config.get('record_frames', 600)
+    self.udp_port = config.get('udp_port', 0)
+    self.transition_ms = config.get('transition_ms', 0)
+    # a Leds driving segments has no strip of its own
+    self.sparkles = l.leds.n * self.random // 100 if l.leds is not None else 0
+    # gamma and brightness are baked into the palette and template
+    if prev is not None and prev.gamma == self.gamma and prev.brightness == self.brightness:
+      self.output_lut = prev.output_lut
+    else:
+      self.output_lut = output_lut(self.gamma, self.brightness)
+    if (prev is not None and prev.output_lut is self.output_lut and prev.colors == self.colors
+        and prev.gradient == self.gradient and prev.spread == self.spread
+        and prev.space_between == self.space_between and prev.offset == self.offset):
+      self.palette = prev.palette
+      self.template = prev.template
+    elif self.colors and l.leds is not None and self.gradient != 'none':
+      # the palette is the 256 entry ramp, a period spans spread pixels per color
+      self.palette = ramp(l, self.colors, self.gradient, self.output_lut)
+      self.template = stretch(l, self.palette, len(self.colors) * self.spread, self.offset)
+    elif self.colors and l.leds is not None:
+      self.palette = pack(l, self.colors, self.output_lut)
+      self.template = pattern(l, self.colors, self.spread, self.space_between, self.output_lut, self.offset)
+    else:
+      self.palette = None
+      self.template = None
+    if prev is not None and prev.decay == self.decay:
+      self.decay_lut = prev.decay_lut
+    else:
+      self.decay_lut = decay_lut(self.decay)
+
+def _driver(pin, n, sm=0, pipeline=0):
+  """ the strip for one pin, pipeline selects the DMA driven ws2812.WS2812 """
+  if pipeline:
+    import ws2812
+    return ws2812.WS2812(machine.Pin(pin), n, sm=sm)
+  return neopixel.NeoPixel(machine.Pin(pin), n)
+
+_not_inherited = ('segments', 'play', 'record', 'udp_port', 'max_ma')
+
+def segment_configs(config):
+  """
+  one config per segment, the base config overridden by the segment's own
+  keys; recordings and streams are per strip so those are not inherited,
+  and the strips share one supply so each gets its part of max_ma
+  """
+  segs = []
+  for i, seg in enumerate(config.get('segments') or ()):
+    c = {}
+    for key in config:
+      if key not in _not_inherited:
+        c[key] = config[key]
+    for key in seg:
+      c[key] = seg[key]
+    # each segment gets its own state machine so the writes overlap
+    c['sm'] = i
+    c['pipeline'] = 1
+    segs.append(c)
+  max_ma = config.get('max_ma', 0)
+  if max_ma and segs:
+    total = sum(c.get('nleds', _default_nleds) for c in segs)
+    for c in segs:
+      # by length, a segment's own max_ma can only lower its part
+      share = max_ma * c.get('nleds', _default_nleds) // total
+      c['max_ma'] = min(c.get('max_ma') or share, share)
+  return segs
+
+def strips(config):
+  """ (pin, nleds, pipeline) of each strip config drives, changing any means new strips """
+  return [(c.get('pin', _default_pin), c.get('nleds', _default_nleds), c.get('pipeline', 0))
+    for c in segment_configs(config) or (config,)]
 
 class Leds(object):
 
-  def __init__(self, config={}):
+  def __init__(self, config={}, clock=time, driver=_driver):
     if isinstance(config, list):
       self.config = {'colors': config}
     if isinstance(config, tuple):
@@ -36,19 +150,84 @@ class Leds(object):
     if isinstance(config, dict):
       self.config = config
     self.exit = False
+    self.dirty = False
+    self.frames_written = 0
+    self.frames_skipped = 0
+    self.frames_limited = 0
+    self.transitions = 0
+    self.blend_us = 0
+    self.sum = 0
+    self.ma = 0
+    # the current limit as a scale out of 256, applied to what is sent, never to leds.buf
+    self._k = 256
+    self._out = None
+    self.scheduler = Scheduler(clock)
+    self.profiler = None
+    self.player = None
+    self.recorder = None
+    self.receiver = None
     self.leds = None
     self.pin = None
-    self._alloc()
-    self.avgtick = 0
+    self._front = None
+    self._driver = driver
+    self._rng = array.array('I', [1])
+    # transitions: the frame blended away from and the scene kept aside while the blend is shown
+    self._from = None
+    self._scene = None
+    self._scene_sum = 0
+    self._blend_ms = 0
+    self._blending = False
+    self._restore = False
+    # a config with other strips, waiting for the LED thread to put them up
+    self._rebuild = None
+    self._build()
+    self._tick_ms = 0
     self._nticks = 0
+    self._avg_ms = 0
+    self._avg_n = 0
+
+  def _build(self):
+    """ the segments or the strip for self.config, and the first frame on them """
+    self.segments = [Leds(c, self.scheduler.clock, self._driver) for c in segment_configs(self.config)]
+    self._strips = strips(self.config)
+    self._blending = False
+    self._restore = False
+    if not self.segments:
+      self._alloc()
+    self.snap = Snapshot(self, self.config)
+    self._next = self.snap
+    seed(self, self.snap.seed)
+    if not self.segments:
+      self.fill(show=True)
+      self._open(self.snap)
+
+  def _relayout(self):
+    """ take down the strips and build the ones the config waiting in _rebuild has """
+    self.config = self._rebuild
+    self._rebuild = None
+    for l in self.segments or (self,):
+      l._release()
+    self._build()
+
+  def _release(self):
+    """ stop playing, recording and streaming, blank the strip and let go of it """
+    self._close()
+    clear(self)
+    if hasattr(self.leds, 'deinit'):
+      self.leds.deinit()
+    self.leds = None
 
   def _alloc(self):
     if not self._need_realloc():
       return
     self.pin = self.config.get('pin', _default_pin)
     nleds = self.config.get('nleds', _default_nleds)
-    self.leds = neopixel.NeoPixel(machine.Pin(self.pin), nleds)
-    self.fill(show=True)
+    pipeline = self.config.get('pipeline', 0)
+    self.leds = self._driver(self.pin, nleds, self.config.get('sm', 0), pipeline)
+    # render into leds.buf while the DMA sends _front
+    self._front = bytearray(len(self.leds.buf)) if pipeline else None
+    self._out = None
+    self._scratch = bytearray(_max_crawl * self.leds.bpp)
 
   def _need_realloc(self):
     if self.leds is None:
@@ -59,48 +238,359 @@ class Leds(object):
     nleds = self.config.get('nleds', _default_nleds)
     if nleds != self.leds.n:
       return True
+    if (self.config.get('pipeline', 0) != 0) != (self._front is not None):
+      return True
     return False
 
+  # with segments each call applies to every segment
   def fill(self, colors=None, show=False):
-    fill(self, colors, show)
+    for l in self.segments or (self,):
+      fill(l, colors if colors is not None else l.snap.colors, show)
   def fillr(self, r=None, colors=None, show=False):
-    fillr(self, r, colors, show)
+    for l in self.segments or (self,):
+      fillr(l, r, colors, show)
   def crawl(self, d=None, show=False):
-    crawl(self, d, show)
+    for l in self.segments or (self,):
+      crawl(l, d, show)
   def fade(self, f=None, show=False):
-    fade(self, f, show)
+    for l in self.segments or (self,):
+      fade(l, f, show)
   def show(self):
+    if self.segments:
+      for l in self.segments:
+        l.show()
+    elif self._k < 256:
+      self._show_limited()
+    elif self._front is None:
+      self.leds.write()
+    else:
+      # send the frame just rendered and carry on rendering in the other buffer
+      back = self.leds.buf
+      self.leds.write(back)
+      self.leds.buf = self._front
+      self._front = back
+      _copy(self.leds.buf, back, len(back))
+    self.dirty = False
+
+  def _show_limited(self):
+    """ send a copy dimmed to the current limit, the frame rendered carries on as it is """
+    buf = self.leds.buf
+    n = len(buf)
+    if self._front is not None:
+      # _front may still be on its way out
+      self.leds.wait()
+      _scale8(self._front, buf, n, self._k)
+      self.leds.write(self._front)
+      return
+    if self._out is None:
+      self._out = bytearray(n)
+    _scale8(self._out, buf, n, self._k)
+    # NeoPixel only sends its own buf, write() blocks so it can be put back straight after
+    self.leds.buf = self._out
     self.leds.write()
+    self.leds.buf = buf
 
   def clear(self):
-    clear(self, show=False)
+    for l in self.segments or (self,):
+      clear(l, show=False)
+
+  def prepare(self, config):
+    """ the snapshots for config built now, for publish(prepared=) to swap in later at no cost """
+    if self._rebuild is not None or strips(config) != self._strips:
+      # segments added, removed or resized, there is nothing to build them against yet
+      return Snapshot(self, config, self._next), [], config
+    segs = [l.prepare(c) for l, c in zip(self.segments, segment_configs(config))]
+    return Snapshot(self, config, self._next), segs, None
+
+  def publish(self, config=None, prepared=None):
+    """ snapshot config (default self.config), or take a prepared one, for the LED thread to pick up """
+    if prepared is None:
+      prepared = self.prepare(config if config is not None else self.config)
+    snap, segs, rebuild = prepared
+    if rebuild is not None:
+      # set before _next, which is what wakes the LED thread
+      self._rebuild = rebuild
+    for l, p in zip(self.segments, segs):
+      l.publish(prepared=p)
+    self._next = snap
+
+  def _apply(self, s):
+    old = self.snap
+    self.snap = s
+    if s.transition_ms and self.receiver is None:
+      self._start_transition()
+    elif self._blending:
+      # transitions turned off mid blend, the scene under it goes out as it is
+      self._blending = False
+      self.dirty = True
+    if s.seed != old.seed:
+      seed(self, s.seed)
+    if s.template is not old.template:
+      # a new scene, nothing to put back
+      self._restore = False
+      self.fill()
+    self._open(s, old)
+
+  def _start_transition(self):
+    """ keep the frame on show to blend the new scene in from """
+    n = self.leds.n * self.leds.bpp
+    if self._from is None or len(self._from) != n:
+      self._from = bytearray(n)
+      self._scene = bytearray(n)
+    _copy(self._from, self.leds.buf, n)
+    self._blend_ms = self.scheduler.clock.ticks_ms()
+    self._blending = True
+    self.transitions += 1
+
+  def _open(self, s, old=None):
+    """ start or stop playing, recording and streaming when their settings change """
+    if old is None or s.play != old.play:
+      if self.player is not None:
+        self.player.close()
+        self.player = None
+      if s.play:
+        try:
+          self.player = frames.Player(s.play)
+          if self.player.bpp != self.leds.bpp:
+            self.player.close()
+            self.player = None
+            print('play', s.play, 'wrong bytes per pixel')
+        except (OSError, ValueError) as e:
+          print('play', s.play, e)
+    # only a change starts a recording, opening it truncates the file
+    if old is not None and s.record != old.record:
+      self._close_recorder()
+      if s.record:
+        try:
+          self.recorder = frames.Recorder(s.record, self.leds.n, self.leds.bpp, s.period_ms)
+        except OSError as e:
+          print('record', s.record, e)
+    if old is None or s.udp_port != old.udp_port:
+      if self.receiver is not None:
+        self.receiver.close()
+        self.receiver = None
+      if s.udp_port:
+        try:
+          self.receiver = ddp.Receiver(s.udp_port, self.scheduler.clock)
+          self._order = bytes(self.leds.ORDER[:self.leds.bpp])
+        except OSError as e:
+          print('udp', s.udp_port, e)
+
+  def _close_recorder(self):
+    if self.recorder is not None:
+      self.recorder.close()
+      self.recorder = None
+
+  def _close(self):
+    self._close_recorder()
+    for f in (self.player, self.receiver):
+      if f is not None:
+        f.close()
+    self.player = None
+    self.receiver = None
+
+  def _profiler(self):
+    if not self.snap.profile:
+      return None
+    if self.profiler is None:
+      self.profiler = profiler.Profiler(self.scheduler.clock)
+    return self.profiler
 
   def tick(self):
-    self.crawl(self.config.get('crawl',0))
-    self.fade(self.config.get('fade',0))
-    self.fillr(self.config.get('random',0), self.config.get('colors'))
-    self.leds.write()
+    if self._rebuild is not None:
+      self._relayout()
+    if self.segments:
+      self.snap = self._next
+      # the frames go out together, each segment's profile leaves out the others' renders
+      for l in self.segments:
+        l.render()
+        p = l._profiler()
+        if p:
+          p.pause()
+      for l in self.segments:
+        p = l._profiler()
+        if p:
+          p.resume()
+        l.output()
+    else:
+      self.render()
+      self.output()
+
+  def render(self):
+    """ work out the next frame """
+    p = self._profiler()
+    if p:
+      p.start()
+    if self._next is not self.snap:
+      self._apply(self._next)
+    if self._restore:
+      # the last frame shown was a blend, carry on from the scene under it
+      _copy(self.leds.buf, self._scene, len(self._scene))
+      self.sum = self._scene_sum
+      self._restore = False
+    if p:
+      p.mark(profiler.FILL)
+    # the module functions directly, the methods would build a tuple to loop over
+    s = self.snap
+    if self.receiver is not None:
+      # a stream stands in for everything else, a frame is done when pushed
+      pushed = stream(self)
+      if p:
+        p.mark(profiler.STREAM)
+      if not pushed:
+        return
+    elif self.player is not None:
+      # a recording stands in for the effects
+      play(self)
+      if p:
+        p.mark(profiler.PLAY)
+    else:
+      crawl(self, s.crawl, False)
+      if p:
+        p.mark(profiler.CRAWL)
+      fade(self, s.fade, False)
+      if p:
+        p.mark(profiler.FADE)
+      fillr(self, s.random, s.colors, False)
+      if p:
+        p.mark(profiler.FILLR)
+    if self.recorder is not None:
+      # before the limiter, it is applied again on playback
+      record(self)
+    if self._blending:
+      blend(self)
+      if p:
+        p.mark(profiler.BLEND)
+    self._limit(s.max_ma)
+
+  def output(self):
+    """ send the frame if it changed """
+    p = self._profiler()
+    if self.dirty:
+      self.show()
+      self.frames_written += 1
+    else:
+      self.frames_skipped += 1
+    if p:
+      p.mark(profiler.WRITE)
+      p.end()
+
+  def _limit(self, max_ma):
+    """ estimate the draw from the running byte sum and the scale show() dims the output by to fit max_ma """
+    n = self.leds.n
+    ma = self.sum * _channel_ma // 255
+    avail = max_ma - n * _idle_ma
+    k = 256
+    if max_ma and ma > avail:
+      k = max(avail, 0) * 256 // ma
+      ma = ma * k >> 8
+      self.frames_limited += 1
+    if k != self._k:
+      # dimmer, or back up to full, the frame has to go out again
+      self._k = k
+      self.dirty = True
+    self.ma = ma + n * _idle_ma
+
+  def idle(self):
+    """ True when nothing animates and the last frame has been written """
+    s = self.snap
+    if self.segments:
+      for l in self.segments:
+        if not l.idle():
+          return False
+      return self._next is s
+    return not (self.dirty or s.crawl or s.fade or s.random or self.player or self.recorder
+      or self.receiver or self._blending or self._next is not s)
+
+  def _wait_for_change(self):
+    waited = 0
+    while self._next is self.snap and not self.exit:
+      self.scheduler.clock.sleep_ms(_idle_ms)
+      waited = self._skipped(waited + _idle_ms)
+
+  def _skipped(self, waited):
+    # every period slept through counts as a skipped frame
+    if waited >= self.snap.period_ms:
+      self.frames_skipped += waited // self.snap.period_ms
+      waited %= self.snap.period_ms
+    return waited
+
+  def metrics(self):
+    m = self.scheduler.metrics()
+    m['avgtick_ms'] = self._avg_ms / self._avg_n if self._avg_n else 0
+    if self.segments:
+      m['segments'] = [l._strip_metrics() for l in self.segments]
+      m['est_ma'] = sum(l.ma for l in self.segments)
+    else:
+      m.update(self._strip_metrics())
+    return m
+
+  def _strip_metrics(self):
+    m = {}
+    m['frames_written'] = self.frames_written
+    m['frames_skipped'] = self.frames_skipped
+    m['frames_limited'] = self.frames_limited
+    m['transitions'] = self.transitions
+    m['blend_us'] = self.blend_us
+    m['est_ma'] = self.ma
+    if self.player is not None:
+      m['play'] = {'file': self.player.path, 'frames': self.player.frames, 'loops': self.player.loops}
+    if self.recorder is not None:
+      r = self.recorder
+      m['record'] = {'file': r.path, 'frames': r.frames, 'keyframes': r.keyframes, 'bytes': r.bytes}
+    if self.receiver is not None:
+      m['stream'] = self.receiver.metrics()
+    if self.profiler is not None:
+      m['profile'] = self.profiler.report()
+    return m
 
   def _update_avgtick(self, ms):
-    if ms > 0:
-      self.avgtick = (self.avgtick * self._nticks + ms)/(self._nticks + 1)
-      self._nticks += 1
-    if self._nticks > 10:
+    # whole ms summed over windows of 10 ticks, a float here would allocate every tick
+    self._tick_ms += ms
+    self._nticks += 1
+    if self._nticks >= 10:
+      self._avg_ms = self._tick_ms
+      self._avg_n = self._nticks
+      self._tick_ms = 0
       self._nticks = 0
 
   def loop(self):
+    s = self.scheduler
+    s.reset()
     while True:
       if self.exit:
         break
-      start_ms = time.ticks_ms()
+      snap = self.snap
+      s.wait(snap.period_ms, snap.policy)
       self.tick()
-      elapsed_ms = time.ticks_ms() - start_ms
-      self._update_avgtick(elapsed_ms)
-      period_ms = self.config.get('period_ms', 250)
-      next_ms = int(period_ms - elapsed_ms)
-      if next_ms <= 0:
-        next_ms = period_ms
-      time.sleep_ms(next_ms)
+      self._update_avgtick(s.done(snap.period_ms))
+      if self.idle():
+        self._wait_for_change()
+        s.reset()
+    for l in self.segments or (self,):
+      l._close()
+
+  async def aloop(self):
+    """ loop() as an asyncio task, for running on one core without _thread """
+    import asyncio
+    sleep_ms = getattr(asyncio, 'sleep_ms', None) or (lambda ms: asyncio.sleep(ms / 1000))
+    s = self.scheduler
+    s.reset()
+    while not self.exit:
+      snap = self.snap
+      # sleep even when late so the other tasks get a turn
+      await sleep_ms(s.due(snap.period_ms, snap.policy))
+      s.begin()
+      self.tick()
+      self._update_avgtick(s.done(snap.period_ms))
+      if self.idle():
+        waited = 0
+        while self._next is self.snap and not self.exit:
+          await sleep_ms(_idle_ms)
+          waited = self._skipped(waited + _idle_ms)
+        s.reset()
+    for l in self.segments or (self,):
+      l._close()
 
   def start(self, inthread=True):
     self.exit = False
@@ -126,62 +616,398 @@ if __name__ == "__main__":
   l.start(config, inthread=False)
 
 
+def decay_lut(decay=128):
+  """ 256 entry table mapping a byte to byte * decay / 256 """
+  return bytearray((i * decay) >> 8 for i in range(256))
+
+# the byte kernels return the new sum of the bytes (or the change in it)
+# so Leds.sum stays current without rescanning the buffer
+try:
+  @micropython.viper
+  def _lut8(buf, lut, n:int) -> int:
+    # a word at a time, then the odd bytes at the end
+    w = ptr32(buf)
+    t = ptr8(lut)
+    s = 0
+    for i in range(n >> 2):
+      x = w[i]
+      a = t[x & 0xff]
+      b = t[(x >> 8) & 0xff]
+      c = t[(x >> 16) & 0xff]
+      d = t[(x >> 24) & 0xff]
+      w[i] = a | (b << 8) | (c << 16) | (d << 24)
+      s += a + b + c + d
+    p = ptr8(buf)
+    for i in range((n >> 2) << 2, n):
+      a = t[p[i]]
+      p[i] = a
+      s += a
+    return s
+
+  @micropython.viper
+  def _scale8(dst, src, n:int, k:int) -> int:
+    # src scaled by k/256 into dst
+    d = ptr8(dst)
+    p = ptr8(src)
+    s = 0
+    for i in range(n):
+      a = (p[i] * k) >> 8
+      d[i] = a
+      s += a
+    return s
+
+  @micropython.viper
+  def _sum8(buf, n:int) -> int:
+    p = ptr8(buf)
+    s = 0
+    for i in range(n):
+      s += p[i]
+    return s
+
+  @micropython.viper
+  def _blend8(buf, src, n:int, a:int) -> int:
+    # a/256 of the way from src to buf, into buf
+    b = ptr8(buf)
+    s = ptr8(src)
+    t = 0
+    for i in range(n):
+      x = s[i]
+      v = x + (((b[i] - x) * a) >> 8)
+      b[i] = v
+      t += v
+    return t
+
+  @micropython.viper
+  def _copy(dst, src, n:int):
+    # a slice assignment would allocate the slice object
+    d = ptr32(dst)
+    s = ptr32(src)
+    for i in range(n >> 2):
+      d[i] = s[i]
+    d8 = ptr8(dst)
+    s8 = ptr8(src)
+    for i in range((n >> 2) << 2, n):
+      d8[i] = s8[i]
+except (NameError, AttributeError):
+  # no viper emitter (CPython), translate does the same lookup
+  def _lut8(buf, lut, n):
+    buf[:n] = buf[:n].translate(lut)
+    return sum(buf[:n])
+
+  def _scale8(dst, src, n, k):
+    dst[:n] = src[:n].translate(decay_lut(k))
+    return sum(dst[:n])
+
+  def _sum8(buf, n):
+    return sum(memoryview(buf)[:n])
+
+  def _blend8(buf, src, n, a):
+    for i in range(n):
+      x = src[i]
+      buf[i] = x + ((buf[i] - x) * a >> 8)
+    return sum(memoryview(buf)[:n])
+
+  def _copy(dst, src, n):
+    memoryview(dst)[:n] = memoryview(src)[:n]
+
 @micropython.native
 def fade(l:Leds, f=None, show=True):
-  f = f if f is not None else l.config.get('fade', 50)
+  f = f if f is not None else l.snap.fade
   # fade (0,1) 1=on
   #f = min(max(f,0),1)
   if f == 0:
     return
-  for i in range(l.leds.n * l.leds.bpp):
-    l.leds.buf[i] >>= 1
-  l.filled = False
+  # decay (0..255) 128=halve each tick
+  l.sum = _lut8(l.leds.buf, l.snap.decay_lut, l.leds.n * l.leds.bpp)
+  l.dirty = True
   if show:
     l.leds.write()
 
+try:
+  @micropython.viper
+  def _rotate(buf, scratch, n:int, k:int):
+    # rotate n bytes of buf by k in place, k>0 right, k<0 left
+    b = ptr8(buf)
+    s = ptr8(scratch)
+    if k > 0:
+      for i in range(k):
+        s[i] = b[n - k + i]
+      i = n - 1
+      while i >= k:
+        b[i] = b[i - k]
+        i -= 1
+      for i in range(k):
+        b[i] = s[i]
+    elif k < 0:
+      k = 0 - k
+      for i in range(k):
+        s[i] = b[i]
+      for i in range(n - k):
+        b[i] = b[i + k]
+      for i in range(k):
+        b[n - k + i] = s[i]
+except (NameError, AttributeError):
+  # no viper emitter (CPython), memoryview assignment handles the overlap
+  def _rotate(buf, scratch, n, k):
+    mv = memoryview(buf)
+    if k > 0:
+      scratch[:k] = mv[n - k:n]
+      mv[k:n] = mv[:n - k]
+      mv[:k] = scratch[:k]
+    elif k < 0:
+      k = -k
+      scratch[:k] = mv[:k]
+      mv[:n - k] = mv[k:n]
+      mv[n - k:n] = scratch[:k]
+
 @micropython.native
 def crawl(l:Leds, d=0, show=True):
   if d == 0:
     return
-  # crawl (0, -1, 1) -1=left, 1=right
-  #d = min(max(d,-1),1)
-  shift = -d * l.leds.bpp
-  if shift != 0:
-    l.leds.buf[:] = l.leds.buf[shift:] + l.leds.buf[:shift]
+  # crawl (-50..50) <0=left, >0=right, pixels per tick
+  n = l.leds.n * l.leds.bpp
+  shift = (d % l.leds.n if d > 0 else -(-d % l.leds.n)) * l.leds.bpp
+  if shift > len(l._scratch) or -shift > len(l._scratch):
+    l._scratch = bytearray(abs(shift))
+  _rotate(l.leds.buf, l._scratch, n, shift)
+  l.dirty = True
   if show:
     l.leds.write()
 
+def output_lut(gamma=22, brightness=255):
+  """ 256 entry table applying gamma (in tenths, 10=linear) then brightness (0..255) """
+  g = gamma / 10
+  return bytearray(int(brightness * (i / 255) ** g + 0.5) for i in range(256))
+
+def pack(l:Leds, colors, lut=None):
+  """ pack color tuples into the strip's byte order, through the output lut if given """
+  bpp = l.leds.bpp
+  order = l.leds.ORDER
+  buf = bytearray(len(colors) * bpp)
+  for j in range(len(colors)):
+    c = colors[j]
+    for k in range(min(len(c), bpp)):
+      buf[j * bpp + order[k]] = c[k] if lut is None else lut[c[k]]
+  return buf
+
+def _to_hsv(c):
+  """ hue (0..6), saturation (0..1), value (0..255) """
+  r, g, b = c[0], c[1], c[2]
+  v = max(r, g, b)
+  d = v - min(r, g, b)
+  if d == 0:
+    return 0, 0, v
+  if v == r:
+    h = (g - b) / d % 6
+  elif v == g:
+    h = (b - r) / d + 2
+  else:
+    h = (r - g) / d + 4
+  return h, d / v, v
+
+def _from_hsv(h, s, v):
+  h %= 6
+  i = int(h)
+  f = h - i
+  p = v * (1 - s)
+  q = v * (1 - s * f)
+  t = v * (1 - s * (1 - f))
+  c = ((v, t, p), (q, v, p), (p, v, t), (p, q, v), (t, p, v), (v, p, q))[i]
+  return (int(c[0] + 0.5), int(c[1] + 0.5), int(c[2] + 0.5))
+
+def _blend(a, b, t, mode):
+  """ t/256 of the way from color a to b """
+  if mode == 'hsv':
+    ha, sa, va = _to_hsv(a)
+    hb, sb, vb = _to_hsv(b)
+    # a gray has no hue of its own, take the other color's
+    if sa == 0:
+      ha = hb
+    if sb == 0:
+      hb = ha
+    dh = hb - ha
+    # the short way round the wheel
+    if dh > 3:
+      dh -= 6
+    elif dh < -3:
+      dh += 6
+    return _from_hsv(ha + dh * t / 256, sa + (sb - sa) * t / 256, va + (vb - va) * t / 256)
+  return tuple(a[k] + ((b[k] - a[k]) * t >> 8) for k in range(len(a)))
+
+def ramp(l:Leds, colors, mode='linear', lut=None):
+  """
+  256 packed entries blending through colors and back round to the
+  first, linearly in rgb or around the hsv wheel
+  """
+  n = len(colors)
+  blended = []
+  for j in range(256):
+    x = j * n
+    blended.append(_blend(colors[x >> 8], colors[((x >> 8) + 1) % n], x & 0xff, mode))
+  return pack(l, blended, lut)
+
+def stretch(l:Leds, palette, period, offset=0):
+  """ one period of the ramp sampled over period pixels, starting offset pixels in """
+  bpp = l.leds.bpp
+  t = bytearray(period * bpp)
+  for i in range(period):
+    j = (i + offset) % period * 256 // period * bpp
+    t[i * bpp:(i + 1) * bpp] = palette[j:j + bpp]
+  return t
+
+def seed(l:Leds, s=0):
+  """ restart the sparkle sequence, 0 seeds from the random module """
+  l._rng[0] = s if s else random.getrandbits(32) | 1
+
+# xorshift32, the 15 bit fields pick the pixel and the palette entry
+try:
+  @micropython.viper
+  def _sparkle(buf, pal, state, n:int, bpp:int, npal:int, count:int) -> int:
+    b = ptr8(buf)
+    p = ptr8(pal)
+    s = ptr32(state)
+    x = s[0]
+    d = 0
+    for _ in range(count):
+      x ^= x << 13
+      x ^= (x >> 17) & 0x7fff
+      x ^= x << 5
+      o = (((x & 0x7fff) * n) >> 15) * bpp
+      c = ((((x >> 16) & 0x7fff) * npal) >> 15) * bpp
+      for k in range(bpp):
+        d += p[c + k] - b[o + k]
+        b[o + k] = p[c + k]
+    s[0] = x
+    return d
+except (NameError, AttributeError):
+  # no viper emitter (CPython), same sequence with explicit 32 bit masks
+  def _sparkle(buf, pal, state, n, bpp, npal, count):
+    x = state[0]
+    d = 0
+    for _ in range(count):
+      x ^= (x << 13) & 0xffffffff
+      x ^= x >> 17
+      x ^= (x << 5) & 0xffffffff
+      o = (((x & 0x7fff) * n) >> 15) * bpp
+      c = ((((x >> 16) & 0x7fff) * npal) >> 15) * bpp
+      d += sum(pal[c:c + bpp]) - sum(buf[o:o + bpp])
+      buf[o:o + bpp] = pal[c:c + bpp]
+    state[0] = x
+    return d
+
 @micropython.native
 def fillr(l:Leds, r=0, colors=None, show=True):
   if r == 0 or colors is None:
     return
   # fill random (0..100)
   #r = min(max(r,0),100)
-  rleds = range(l.leds.n)
-  rcolors = range(len(colors))
-  for x in range(int(l.leds.n * r/100)):
-    i = random.choice(rleds)
-    j = random.choice(rcolors)
-    l.leds[i] = colors[j]
-  l.filled = False
+  if isinstance(colors, tuple):
+    colors = [colors]
+  palette = l.snap.palette if colors is l.snap.colors else pack(l, colors, l.snap.output_lut)
+  count = l.snap.sparkles if r == l.snap.random else l.leds.n * r // 100
+  bpp = l.leds.bpp
+  l.sum += _sparkle(l.leds.buf, palette, l._rng, l.leds.n, bpp, len(palette) // bpp, count)
+  l.dirty = True
   if show:
     l.leds.write()
 
+def pattern(l:Leds, colors, spread=1, space_between=0, lut=None, offset=0):
+  """
+  one period of the pattern: each color spread pixels wide followed by
+  space_between black pixels, starting offset pixels into the period
+  """
+  bpp = l.leds.bpp
+  packed = pack(l, colors, lut)
+  step = (spread + space_between) * bpp
+  t = bytearray(len(colors) * step)
+  for j in range(len(colors)):
+    c = packed[j * bpp:(j + 1) * bpp]
+    for i in range(spread):
+      o = j * step + i * bpp
+      t[o:o + bpp] = c
+  if offset:
+    k = offset % (len(t) // bpp) * bpp
+    t = t[k:] + t[:k]
+  return t
+
+def tile(buf, template, n):
+  """ repeat template over the first n bytes of buf, doubling the copied span each pass """
+  mv = memoryview(buf)
+  k = min(len(template), n)
+  mv[:k] = memoryview(template)[:k]
+  while k < n:
+    m = min(k, n - k)
+    mv[k:k + m] = mv[:m]
+    k += m
+
 @micropython.native
 def fill(l:Leds, colors=None, show=True):
   if colors is None:
     return
+  s = l.snap
   if isinstance(colors, tuple):
-    l.leds.fill(colors) # single color
+    tile(l.leds.buf, pack(l, [colors], s.output_lut), l.leds.n * l.leds.bpp) # single color
   elif isinstance(colors, list):
-    ncolors = len(colors)
-    for i in range(l.leds.n):
-      l.leds[i] = colors[i % ncolors]
-  l.filled = True
+    if len(colors) == 0:
+      l.leds.fill(black)
+    else:
+      t = s.template if colors is s.colors else pattern(l, colors, s.spread, s.space_between, s.output_lut)
+      tile(l.leds.buf, t, l.leds.n * l.leds.bpp)
+  l.sum = _sum8(l.leds.buf, l.leds.n * l.leds.bpp)
+  l.dirty = True
   if show:
     l.leds.write()
 
+def play(l:Leds):
+  """ the next frame of the recording into the strip, a shorter recording leaves the rest """
+  pl = l.player
+  if not pl.next():
+    return
+  n = l.leds.n * l.leds.bpp
+  _copy(l.leds.buf, pl.frame, min(pl.size, n))
+  l.sum = _sum8(l.leds.buf, n)
+  l.dirty = True
+
+def blend(l:Leds):
+  """
+  show the scene transition_ms into its blend in from the previous
+  frame; the scene is set aside and put back at the next render
+  """
+  c = l.scheduler.clock
+  start = c.ticks_us()
+  a = c.ticks_diff(c.ticks_ms(), l._blend_ms) * 256 // l.snap.transition_ms
+  if a >= 256:
+    # done, the scene as it is goes out
+    l._blending = False
+    l.dirty = True
+    return
+  n = len(l._scene)
+  _copy(l._scene, l.leds.buf, n)
+  l._scene_sum = l.sum
+  l.sum = _blend8(l.leds.buf, l._from, n, a)
+  l._restore = True
+  l.dirty = True
+  l.blend_us = c.ticks_diff(c.ticks_us(), start)
+
+def stream(l:Leds):
+  """ waiting DDP packets into the strip, True once a whole frame is in """
+  # through the output table like the effects' colors, so gamma and brightness hold for a stream too
+  if not l.receiver.poll(l.leds.buf, l.leds.n, l.leds.bpp, l._order, l.snap.output_lut):
+    return False
+  l.sum = _sum8(l.leds.buf, l.leds.n * l.leds.bpp)
+  l.dirty = True
+  return True
+
+def record(l:Leds):
+  """ append the frame to the recording, closing it after record_frames """
+  r = l.recorder
+  r.add(l.leds.buf)
+  if r.frames >= l.snap.record_frames:
+    l._close_recorder()
+
 def clear(l:Leds, show=True):
   l.leds.fill(black)
+  l.sum = 0
+  l.dirty = True
   if show:
     l.leds.write()
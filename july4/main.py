@@ -1,15 +1,27 @@
 import wifi
 import webserver
+import scenes
 from leds import Leds
 import config as cfg
 
+# serve with asyncio and run the LED loop as a task on this core, no _thread
+single_core = False
+
 cfg.load()
+scenes.load()
 leds = Leds(cfg.config)
-leds.start()
+if not single_core:
+  leds.start()
 
 (wlan, ip) = wifi.connect('sunlight4','Inigo Montoya2013')
 try:
-  webserver.start(ip=ip, load_config=False, leds=leds)
+  # after wifi.connect() so the clock has been set
+  timetable = scenes.Timetable(leds)
+  if single_core:
+    import asyncio
+    asyncio.run(webserver.serve(ip=ip, load_config=False, leds=leds, timetable=timetable, loop_leds=True))
+  else:
+    webserver.start(ip=ip, load_config=False, leds=leds, timetable=timetable)
 except KeyboardInterrupt:
   pass
 finally:
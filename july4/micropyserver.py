@@ -41,26 +41,63 @@ server.on_not_found(static_files(basedir="public"))
 server.start()
 """
 import re
+import select
 import socket
 import sys
+import time
 import io
 import json
 import os
 
+# a request head longer than this is refused
+_max_head = 2048
+# a route path with any of these is a regular expression, matched whole
+_pattern_chars = "{^$*+?()[]|\\"
+# a response whose head and body fit one TCP segment goes out in one send
+_out_size = 1460
+# how often a kept connection waiting for its next request checks for other clients
+_slice_ms = 50
+# after refusing a request, at most this much more of it is read and dropped before closing
+_max_discard = 16384
+
 
 class MicroPyServer(object):
 
-    def __init__(self, host="0.0.0.0", ip='localhost', port=80):
-        """ Constructor """
+    def __init__(self, host="0.0.0.0", ip='localhost', port=80, timeout_s=5, keep_alive_s=5, max_requests=32, max_body=4096):
+        """ Constructor, connections are kept keep_alive_s between requests for up to max_requests """
         self._host = host
         self._ip = ip
         self._port = port
-        self._routes = []
+        self._timeout_s = timeout_s
+        self._keep_alive_s = keep_alive_s
+        self._max_requests = max_requests
+        self._max_body = max_body
+        # request buffers, one for the blocking server, a pool for the asyncio one
+        self._reader = None
+        self._readers = []
+        # responses are put together here, see Response.send()
+        self._out = bytearray(_out_size)
+        self._out_mv = memoryview(self._out)
+        self._connections = 0
+        self._reused = 0
+        self._requests = 0
+        # (method, path) to route for plain paths, (pattern, names, route) for the rest
+        self._exact = {}
+        self._patterns = []
+        # plain path to its methods, for 405s
+        self._methods = {}
         self._connect = None
+        self._aserver = None
+        self._clients = 0
+        self._max_clients = 1
         self._on_request_handler = None
+        self._on_idle_handler = None
+        self._idle_s = None
+        self._idle_ms = 0
         self._on_not_found_handler = None
         self._on_error_handler = None
         self._sock = None
+        self._waiting = None
         self._allowed_content_types = {
             '.gif': 'image/gif',
             '.jpg': 'image/jpeg',
@@ -79,74 +116,290 @@ class MicroPyServer(object):
         self._sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
         self._sock.bind((self._host, self._port))
         self._sock.listen(1)
-        port = ":" + self._port if self._port != 80 else ""
+        self._waiting = select.poll()
+        self._waiting.register(self._sock, select.POLLIN)
+        if self._on_idle_handler is not None:
+            self._sock.settimeout(self._idle_s)
+        port = ":" + str(self._port) if self._port != 80 else ""
         print("listening at http://" + self._ip + port)
         while True:
             if self._sock is None:
                 break
-            try:
-                self._connect, address = self._sock.accept()
-                raw = self._get_request()
-                req = Request(raw, address)
-                res = Response(self)
-                if len(raw) == 0:
-                    self._connect.close()
+            if self._on_idle_handler is not None:
+                self._idle()
+                try:
+                    self._connect, address = self._sock.accept()
+                except OSError:
+                    # timed out, back round to the idle handler
                     continue
-                if self._on_request_handler:
-                    if not self._on_request_handler(req, res):
-                        continue
-                route = self.find_route(req)
-                if route:
-                    route["handler"](req, res)
-                else:
-                    self._route_not_found(req, res)
+            try:
+                if self._on_idle_handler is None:
+                    self._connect, address = self._sock.accept()
+                self._connect.settimeout(self._timeout_s)
+                self._connections += 1
+                self._serve_connection(address)
             except Exception as e:
                 sys.print_exception(e)
                 self._internal_error(e)
             finally:
                 self._connect.close()
 
+    async def serve(self, max_connections=4):
+        """ Serve with asyncio (uasyncio on the device), a task per connection """
+        import asyncio
+        self._max_clients = max_connections
+        self._aserver = await asyncio.start_server(self._serve_client, self._host, self._port, backlog=max_connections)
+        port = ":" + str(self._port) if self._port != 80 else ""
+        print("listening at http://" + self._ip + port)
+        if self._on_idle_handler is not None:
+            asyncio.create_task(self._aidle())
+        await self._aserver.wait_closed()
+
+    def _idle(self):
+        """ Run the idle handler now """
+        self._idle_ms = time.ticks_ms()
+        try:
+            self._on_idle_handler()
+        except Exception as e:
+            sys.print_exception(e)
+
+    def _idle_due(self):
+        """ Run the idle handler if interval_s has gone by since it last ran, for a connection that holds the loop """
+        if self._on_idle_handler is not None and time.ticks_diff(time.ticks_ms(), self._idle_ms) >= self._idle_s * 1000:
+            self._idle()
+
+    async def _aidle(self):
+        import asyncio
+        while self._aserver is not None:
+            self._idle()
+            await asyncio.sleep(self._idle_s)
+
+    async def _serve_client(self, reader, writer):
+        """ One connection: requests in order off it until it closes or idles out, all with timeouts """
+        import asyncio
+        busy = self._clients >= self._max_clients
+        self._clients += 1
+        self._connections += 1
+        try:
+            # the stream may hold on to what it is given until drained, copies keep _out free for the next response
+            send = lambda data: writer.write(bytes(data))
+            if busy:
+                Response(self, send).error(code=503)
+                await self._drain(writer)
+                # no reader to spare, what is read goes into _out, only ever filled and sent without a pause
+                await self._adiscard(reader, self._out_mv)
+                return
+            address = writer.get_extra_info('peername')
+            r = self._readers.pop() if self._readers else _Reader(self._max_body)
+            try:
+                served = 0
+                while served < self._max_requests:
+                    while not r.parse():
+                        # a kept connection may sit quiet for keep_alive_s, a request under way only timeout_s
+                        timeout = self._keep_alive_s if served and r.empty() else self._timeout_s
+                        n = await asyncio.wait_for(_read_into(reader, r.space()), timeout)
+                        if not n:
+                            return
+                        r.end += n
+                    if r.error:
+                        Response(self, send).error(code=r.error)
+                        await self._drain(writer)
+                        await self._adiscard(reader, r.mv)
+                        return
+                    served += 1
+                    keep = served < self._max_requests and _keep_alive(r.head)
+                    try:
+                        sent = self._handle(r.head, r.body, address, send, keep, served == 2)
+                    except Exception as e:
+                        sys.print_exception(e)
+                        self._internal_error(e, send)
+                        sent = keep = False
+                    await self._drain(writer)
+                    if not sent or not keep:
+                        return
+            finally:
+                r.reset()
+                self._readers.append(r)
+        except (asyncio.TimeoutError, OSError):
+            # stalled or gone, nobody to answer
+            pass
+        finally:
+            self._clients -= 1
+            writer.close()
+            try:
+                await writer.wait_closed()
+            except OSError:
+                pass
+
+    async def _drain(self, writer):
+        """ Out with what the response wrote, within timeout_s """
+        import asyncio
+        await asyncio.wait_for(writer.drain(), self._timeout_s)
+
+    async def _adiscard(self, reader, into):
+        """ _discard() for an asyncio stream """
+        import asyncio
+        n = 0
+        while n < _max_discard:
+            try:
+                k = await asyncio.wait_for(_read_into(reader, into), _slice_ms / 1000)
+            except asyncio.TimeoutError:
+                return
+            if not k:
+                return
+            n += k
+
+    def _serve_connection(self, address):
+        """ Requests in order off the blocking connection until it closes, idles out or reaches max_requests """
+        if self._reader is None:
+            self._reader = _Reader(self._max_body)
+        r = self._reader
+        r.reset()
+        served = 0
+        while served < self._max_requests:
+            # the loop is this connection's until it goes, the idle handler still gets its turns
+            self._idle_due()
+            while not r.parse():
+                n = self._recv_kept(r.space()) if served and r.empty() else self._recv(r.space())
+                if not n:
+                    return
+                r.end += n
+            if r.error:
+                Response(self).error(code=r.error)
+                self._discard(r.mv)
+                return
+            served += 1
+            keep = served < self._max_requests and _keep_alive(r.head)
+            if not self._handle(r.head, r.body, address, self.send, keep, served == 2) or not keep:
+                return
+
+    def _recv(self, into):
+        """ Bytes read from the connection into the memoryview into, 0 once it is closed or stalled """
+        try:
+            if hasattr(self._connect, "recv_into"):
+                return self._connect.recv_into(into)
+            return self._connect.readinto(into) or 0
+        except OSError:
+            return 0
+
+    def _recv_kept(self, into):
+        """ _recv() between requests, 0 after keep_alive_s or as soon as another client is waiting """
+        ready = select.poll()
+        ready.register(self._connect, select.POLLIN)
+        for _ in range(self._keep_alive_s * 1000 // _slice_ms):
+            self._idle_due()
+            if ready.poll(_slice_ms):
+                return self._recv(into)
+            if self._waiting.poll(0):
+                # one connection at a time here, an idle one must not hold up the next
+                return 0
+        return 0
+
+    def _discard(self, into):
+        """ Read and drop what the client has already sent, closing on unread bytes resets the connection and loses the response """
+        ready = select.poll()
+        ready.register(self._connect, select.POLLIN)
+        n = 0
+        while n < _max_discard and ready.poll(_slice_ms):
+            k = self._recv(into)
+            if not k:
+                return
+            n += k
+
+    def _handle(self, head, body, address, send, keep_alive=False, reused=False):
+        """ Route one request, the response goes out through send, False if none did; reused marks a connection's second request """
+        self._requests += 1
+        if reused:
+            self._reused += 1
+        req = Request(head, body, address)
+        res = Response(self, send, keep_alive)
+        if self._on_request_handler:
+            if not self._on_request_handler(req, res):
+                return res.sent
+        if req.method is None:
+            res.error(code=400)
+            return res.sent
+        route = self.find_route(req)
+        if route:
+            route["handler"](req, res)
+            return res.sent
+        allow = self.allowed(req.path)
+        if allow:
+            res.header("Allow", ", ".join(allow)).error(code=405)
+        else:
+            self._route_not_found(req, res)
+        return res.sent
+
+    def metrics(self):
+        """ Connections accepted and requests served, reused counts the connections that carried more than one request """
+        return {
+            'connections_new': self._connections,
+            'connections_reused': self._reused,
+            'requests': self._requests,
+            'clients': self._clients,
+        }
+
     def stop(self):
         """ Stop the server """
-        self._connect.close()
-        self._sock.close()
+        if self._aserver is not None:
+            self._aserver.close()
+            self._aserver = None
+        if self._connect is not None:
+            self._connect.close()
+        if self._sock is not None:
+            self._sock.close()
         self._sock = None
+        self._waiting = None
         print("Server stop")
 
     def add_route(self, path, handler, method="GET"):
-        """ Add new route  """
-        self._routes.append(
-            {"path": path, "handler": handler, "method": method})
+        """ Add new route, {name} in path matches one path segment, passed to the handler as req.params[name] """
+        route = {"path": path, "handler": handler, "method": method}
+        for c in path:
+            if c in _pattern_chars:
+                pattern, names = _compile(path)
+                self._patterns.append((pattern, names, route))
+                return
+        self._exact[(method, path)] = route
+        self._methods.setdefault(path, []).append(method)
 
     def send(self, data):
-        """ Send data to client """
+        """ Send data to client, bytes or anything with the buffer protocol """
         if self._connect is None:
             raise Exception("Can't send response, no connection instance")
-        self._connect.sendall(data.encode())
+        self._connect.sendall(data)
 
     def find_route(self, req:'Request'):
-        """ Find route """
-        method = req.method
-        path = req.path
-        for route in self._routes:
-            if method != route["method"]:
+        """ Find route, setting req.params from a pattern's captures """
+        route = self._exact.get((req.method, req.path))
+        if route is not None:
+            return route
+        for pattern, names, route in self._patterns:
+            if route["method"] != req.method:
                 continue
-            if path == route["path"]:
+            match = pattern.match(req.path)
+            if match:
+                for i in range(len(names)):
+                    req.params[names[i]] = match.group(i + 1)
                 return route
-            else:
-                match = re.search("^" + route["path"] + "$", path)
-                if match:
-                    print(method, path, route["path"])
-                    return route
 
-    def _get_request(self, buffer_length=4096):
-        """ Return request body """
-        return str(self._connect.recv(buffer_length), "utf8")
+    def allowed(self, path):
+        """ Methods with a route for path """
+        methods = list(self._methods.get(path, ()))
+        for pattern, names, route in self._patterns:
+            if route["method"] not in methods and pattern.match(path):
+                methods.append(route["method"])
+        return methods
 
     def on_request(self, handler):
         """ Set request handler """
         self._on_request_handler = handler
 
+    def on_idle(self, handler, interval_s=1):
+        """ Set handler called between requests, at least every interval_s seconds """
+        self._on_idle_handler = handler
+        self._idle_s = interval_s
+
     def on_not_found(self, handler):
         """ Set not found handler """
         self._on_not_found_handler = handler
@@ -163,8 +416,9 @@ class MicroPyServer(object):
             """ Default not found handler """
             res.error(code=404)
 
-    def _internal_error(self, error):
+    def _internal_error(self, error, send=None):
         """ Internal error handler """
+        send = send if send is not None else self.send
         if self._on_error_handler:
             self._on_error_handler(error)
         else:
@@ -176,9 +430,9 @@ class MicroPyServer(object):
                 output.close()
             else:
                 str_error = str(error)
-            self.send("HTTP/1.0 500 Internal Server Error\r\n")
-            self.send("Content-Type: text/plain\r\n\r\n")
-            self.send("Error: " + str_error)
+            send(("HTTP/1.1 500 Internal Server Error\r\n"
+                  "Content-Type: text/plain\r\nConnection: close\r\n\r\n"
+                  "Error: " + str_error).encode())
             print(str_error)
 
 """ HTTP response codes """
@@ -244,11 +498,14 @@ HTTP_CODES = {
 }
 
 class Request(object):
-    def __init__(self, raw:str, address):
-        """ Constructor """
-        self._raw = raw
+    def __init__(self, head:str, body:memoryview, address):
+        """ Constructor, body is only valid until the handler returns """
+        self._head = head
+        self.body = body
         self.address = address
-        self._line = raw.split("\r\n",1)[0]
+        self.method = self.path = self.query = self.proto = None
+        self.params = {}
+        self._line = head.split("\r\n",1)[0]
         print(self._line)
         match = re.search(r'^([A-Z]+)\s+([^?\s]+)((?:[?&][^&\s]*)*)\s+(HTTP/.*)', self._line)
         if match is not None:
@@ -271,23 +528,24 @@ class Request(object):
         return self.query_params
 
     def json(self):
-        print('raw', self._raw)
-        match = re.search("\r\n\r\n(.+)", self._raw)
-        if match is None:
-            print('no match for body')
+        if len(self.body) == 0:
+            print('no body')
             return None
         try:
-            j = json.loads(match.group(1))
+            j = json.loads(str(self.body, "utf8"))
             return j
         except:
             print('json failure')
             return None
 
 class Response(object):
-    def __init__(self, server:MicroPyServer):
-        """ Constructor """
+    def __init__(self, server:MicroPyServer, send=None, keep_alive=False):
+        """ Constructor, send takes the response bytes and must be done with them on return, default the server's connection """
         self.code = None
         self._server = server
+        self._send = send if send is not None else server.send
+        self.keep_alive = keep_alive
+        self.sent = False
         self.extend_headers = None
 
     def status(self, code):
@@ -305,20 +563,35 @@ class Response(object):
         if isinstance(body, dict) or isinstance(body, list):
           content_type = "application/json"
           body = json.dumps(body)
-        self._server.send("HTTP/1.0 " + str(code) + " " + HTTP_CODES.get(code) + "\r\n")
-        self._server.send("Content type:" + content_type + "\r\n")
+        if isinstance(body, str):
+          body = body.encode()
+        n = len(body) if body is not None else 0
+        head = ("HTTP/1.1 " + str(code) + " " + HTTP_CODES.get(code) + "\r\n"
+                "Content-Type: " + content_type + "\r\n"
+                "Content-Length: " + str(n) + "\r\n"
+                "Connection: " + ("keep-alive" if self.keep_alive else "close") + "\r\n")
         if self.extend_headers is not None:
           for header in self.extend_headers:
-            self._server.send(header + "\r\n")
-        self._server.send("\r\n")
-        if body is not None:
-          self._server.send(body)
+            head += header + ": " + str(self.extend_headers[header]) + "\r\n"
+        head = (head + "\r\n").encode()
+        k = len(head)
+        out = self._server._out
+        if k + n <= len(out):
+          # head and body in one send, through the server's buffer rather than a new head + body
+          out[:k] = head
+          if n:
+            out[k:k + n] = body
+          self._send(self._server._out_mv[:k + n])
+        else:
+          self._send(head)
+          self._send(body)
+        self.sent = True
     
     def send_file(self, fname, code=None):
         try:
             ext = fname[fname.rfind('.'):]
             content_type = self._server._allowed_content_types[ext]
-            with open(fname) as f:
+            with open(fname, "rb") as f:
                 self.send(f.read(), code, content_type)
         except:
             print('File not found:', fname)
@@ -329,6 +602,142 @@ class Response(object):
         msg = msg if msg is not None else str(code) + " " + HTTP_CODES.get(code)
         self.status(code).send("<html><body><code>" + msg + "<code><body><html>")
 
+def _compile(path):
+    """ Route path to a compiled pattern and the names of its {name} parameters """
+    names = []
+    pattern = ""
+    rest = path
+    while "{" in rest:
+        i = rest.find("{")
+        j = rest.find("}", i)
+        pattern += rest[:i] + "([^/]+)"
+        names.append(rest[i + 1:j])
+        rest = rest[j + 1:]
+    return re.compile("^" + pattern + rest + "$"), names
+
+class _Reader(object):
+    """
+    Requests off one connection through one preallocated buffer: the head
+    up to _max_head bytes, then exactly Content-Length body bytes, up to
+    max_body. Bytes past the request stay for the next one (pipelining).
+    """
+
+    def __init__(self, max_body):
+        self.buf = bytearray(_max_head + max_body)
+        self.mv = memoryview(self.buf)
+        self.max_body = max_body
+        self.reset()
+
+    def reset(self):
+        # buf[start:end] is what has arrived of this request and any after it
+        self.start = 0
+        self.end = 0
+        self._scanned = 0
+        self._body_start = 0
+        self._length = 0
+        self.head = None
+        self.body = None
+        self.error = None
+
+    def empty(self):
+        return self.start == self.end
+
+    def space(self):
+        """ memoryview of the free end of buf, after moving the unread bytes to the front """
+        if self.start > 0:
+            n = self.end - self.start
+            # in pieces no longer than the gap, so source and destination never overlap
+            i = 0
+            while i < n:
+                k = min(self.start, n - i)
+                self.buf[i:i + k] = self.mv[self.start + i:self.start + i + k]
+                i += k
+            self._scanned -= self.start
+            if self._body_start:
+                self._body_start -= self.start
+            self.start = 0
+            self.end = n
+        return self.mv[self.end:]
+
+    def parse(self):
+        """ True once the next request has arrived, as head and body, or is refused with error set """
+        if self.head is not None:
+            # the last one was handled, move on to the next
+            self.start = self._body_start + self._length
+            self._scanned = self.start
+            self._body_start = 0
+            self.head = None
+            self.body = None
+        if not self._body_start:
+            if not self._find_head():
+                if self.end - self.start >= _max_head:
+                    self.error = 431
+                    return True
+                return False
+            if self.error:
+                return True
+        if self.end - self._body_start < self._length:
+            if self.end - self.start >= len(self.buf):
+                # no room for the rest, a read into nothing would look like the client closing
+                self.error = 413
+                return True
+            return False
+        self.head = self._head
+        self.body = self.mv[self._body_start:self._body_start + self._length]
+        return True
+
+    def _find_head(self):
+        """ Look for the blank line ending the head in the bytes that came since last time """
+        b = self.buf
+        i = max(self._scanned, self.start + 3)
+        while i < self.end:
+            if b[i] == 10 and b[i - 1] == 13 and b[i - 2] == 10 and b[i - 3] == 13:
+                break
+            i += 1
+        self._scanned = i
+        if i >= self.end:
+            return False
+        # the head, blank line included, is buf[start:i + 1]
+        if i - self.start >= _max_head:
+            self.error = 431
+            return True
+        self._head = str(self.mv[self.start:i - 3], "utf8")
+        self._body_start = i + 1
+        self._length = 0
+        lower = self._head.lower()
+        if "\r\ntransfer-encoding:" in lower:
+            self.error = 411
+            return True
+        i = lower.find("\r\ncontent-length:")
+        if i >= 0:
+            try:
+                self._length = int(lower[i + 17:].split("\r\n", 1)[0].strip())
+            except ValueError:
+                self.error = 400
+                return True
+        if self._length < 0:
+            self.error = 400
+        elif self._length > self.max_body:
+            self.error = 413
+        return True
+
+async def _read_into(reader, into):
+    """ Bytes read from an asyncio stream into the memoryview into """
+    if hasattr(reader, "readinto"):
+        return await reader.readinto(into)
+    data = await reader.read(len(into))
+    into[:len(data)] = data
+    return len(data)
+
+def _keep_alive(head):
+    """ HTTP/1.1 keeps the connection unless asked to close it, HTTP/1.0 only if asked to keep it """
+    head = head.lower()
+    if "\r\nconnection: close" in head:
+        return False
+    if "\r\nconnection: keep-alive" in head:
+        return True
+    return head.split("\r\n", 1)[0].endswith("http/1.1")
+
 def _resolve(path):
     l = []
     p = path.split('/')
@@ -353,9 +762,8 @@ def _safe_path(basedir:str, fname:str, index="index.html"):
 def static_files(basedir="public"):
     def handler(req, res):
         if req.method != 'GET':
-            return res.error(code=405)
+            return res.header("Allow", "GET").error(code=405)
         path = _safe_path(basedir, req.path)
-        if path == False:
+        if not path or res.send_file(path) is False:
             return res.error(code=404)
-        res.send_file(path)
     return handler
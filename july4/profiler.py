@@ -0,0 +1,123 @@
+import array
+import gc
+import time
+
+phases = ('fill', 'crawl', 'fade', 'fillr', 'write', 'play', 'stream', 'blend')
+FILL, CRAWL, FADE, FILLR, WRITE, PLAY, STREAM, BLEND = range(len(phases))
+
+# 100us buckets up to 10ms, 1ms buckets up to 100ms, then one overflow bucket
+_nbuckets = 191
+
+def _bucket(us):
+  if us < 10000:
+    return us // 100
+  if us < 100000:
+    return 90 + us // 1000
+  return _nbuckets - 1
+
+def _upper_us(b):
+  if b < 100:
+    return (b + 1) * 100
+  return (b - 89) * 1000
+
+class Profiler(object):
+  """
+  Fixed memory per-phase tick timing. Each phase gets a histogram in one
+  preallocated array, so recording a sample never allocates.
+  """
+
+  def __init__(self, clock=time):
+    self.clock = clock
+    self.hist = array.array('I', [0] * (len(phases) * _nbuckets))
+    self.max_us = array.array('I', [0] * len(phases))
+    self.reset()
+
+  def reset(self):
+    for i in range(len(self.hist)):
+      self.hist[i] = 0
+    for i in range(len(self.max_us)):
+      self.max_us[i] = 0
+    self.mem_free_min = gc.mem_free() if hasattr(gc, 'mem_free') else 0
+    self.alloc_bytes = 0
+    self.alloc_ticks = 0
+    self._alloc = 0
+    self._t = 0
+    self._paused = 0
+    self._alloc_paused = 0
+
+  def start(self):
+    """ start timing a tick """
+    if hasattr(gc, 'mem_alloc'):
+      self._alloc = gc.mem_alloc()
+    self._t = self.clock.ticks_us()
+
+  def mark(self, phase):
+    """ record the time since the last mark against phase """
+    now = self.clock.ticks_us()
+    us = self.clock.ticks_diff(now, self._t)
+    self._t = now
+    self.hist[phase * _nbuckets + _bucket(us)] += 1
+    if us > self.max_us[phase]:
+      self.max_us[phase] = us
+
+  def pause(self):
+    """ stop the tick's clock while the time goes to something else """
+    self._paused = self.clock.ticks_us()
+    if hasattr(gc, 'mem_alloc'):
+      self._alloc_paused = gc.mem_alloc()
+
+  def resume(self):
+    """ carry on timing the tick, leaving out the time and allocations since pause() """
+    c = self.clock
+    self._t = c.ticks_add(self._t, c.ticks_diff(c.ticks_us(), self._paused))
+    if hasattr(gc, 'mem_alloc'):
+      self._alloc += gc.mem_alloc() - self._alloc_paused
+
+  def end(self):
+    """ finish timing a tick """
+    if hasattr(gc, 'mem_alloc'):
+      # a collection during the tick shows up as a drop, not counted
+      alloc = gc.mem_alloc() - self._alloc
+      if alloc > 0:
+        self.alloc_bytes += alloc
+        self.alloc_ticks += 1
+    if hasattr(gc, 'mem_free'):
+      free = gc.mem_free()
+      if free < self.mem_free_min:
+        self.mem_free_min = free
+
+  def percentiles(self, phase, pcts=(50, 95, 99)):
+    """ upper bound in us of the bucket holding each percentile """
+    o = phase * _nbuckets
+    n = 0
+    for b in range(_nbuckets):
+      n += self.hist[o + b]
+    result = []
+    if n == 0:
+      return [0] * len(pcts), 0
+    for pct in pcts:
+      target = (n * pct + 99) // 100
+      seen = 0
+      for b in range(_nbuckets):
+        seen += self.hist[o + b]
+        if seen >= target:
+          break
+      result.append(min(_upper_us(b), self.max_us[phase]))
+    return result, n
+
+  def report(self):
+    r = {
+      'mem_free_min': self.mem_free_min,
+      'alloc_bytes': self.alloc_bytes,
+      'alloc_ticks': self.alloc_ticks,
+    }
+    for i in range(len(phases)):
+      (p50, p95, p99), n = self.percentiles(i)
+      r[phases[i]] = {
+        'n': n,
+        'p50_ms': p50 / 1000,
+        'p95_ms': p95 / 1000,
+        'p99_ms': p99 / 1000,
+        'max_ms': self.max_us[i] / 1000,
+      }
+    return r
@@ -0,0 +1,190 @@
+"""
+Time of day scenes. A scene is a set of config keys laid over the base
+config; the schedule switches scenes in at local times of day. The next
+scene's snapshot (palette, template and the rest) is built ahead of its
+start, so at the switch the LED thread only picks up a new reference.
+
+schedule.json, next to config.json:
+  {
+    "utc_offset_min": -420,
+    "scenes": {"evening": {"colors": ["#ff0000", "#ffffff"]}, "dim": {"brightness": 40},
+               "off": {"brightness": 0}},
+    "times": [{"at": "17:30", "scene": "evening"}, {"at": "00:00", "scene": "dim"},
+              {"at": "02:00", "scene": "off"}]
+  }
+A time with scene "" goes back to the base config. The device clock is
+UTC once wifi.connect() has run ntptime, utc_offset_min makes it local.
+"""
+import json
+import re
+import time
+import config
+
+_max_scenes = 8
+_max_times = 24
+# build the next scene's snapshot this long before it starts
+_prepare_s = 60
+
+schedule = {
+  'utc_offset_min': 0,
+  'scenes': {},
+  'times': [],
+}
+
+# (minute of the day, scene) sorted by minute, from schedule['times']
+_entries = []
+
+def to_scenes(scenes):
+  """ scene name to the config keys it sets, checked like the config itself """
+  if not isinstance(scenes, dict):
+    return None
+  fixed = {}
+  for name in scenes:
+    keys = scenes[name]
+    if len(fixed) >= _max_scenes or not re.match('^[A-Za-z0-9_-]+$', name) or not isinstance(keys, dict):
+      continue
+    # one shot keys like record would be acted on again at every switch into the scene
+    keys = config._saved(config._fix(keys))
+    fixed[name] = {k: keys[k] for k in keys if k in config.config}
+  return fixed
+
+def _minute(at):
+  """ 'HH:MM' to minutes into the day, None if it is not a time """
+  if not isinstance(at, str):
+    return None
+  match = re.match(r'^(\d\d?):(\d\d)$', at)
+  if match is None:
+    return None
+  h = int(match.group(1))
+  m = int(match.group(2))
+  return h * 60 + m if h < 24 and m < 60 else None
+
+def to_times(times, scenes):
+  if not isinstance(times, list):
+    return None
+  fixed = []
+  for t in times[:_max_times]:
+    if not isinstance(t, dict) or _minute(t.get('at')) is None:
+      continue
+    scene = t.get('scene', '')
+    if scene == '' or scene in scenes:
+      fixed.append({'at': '%02d:%02d' % divmod(_minute(t['at']), 60), 'scene': scene})
+  fixed.sort(key=lambda t: t['at'])
+  return fixed
+
+def update(new_schedule):
+  """ replace the schedule, False if new_schedule is not one """
+  global _entries
+  if not isinstance(new_schedule, dict):
+    return False
+  # the current scenes are already converted, only new ones go through the fixers
+  scenes = to_scenes(new_schedule['scenes']) if 'scenes' in new_schedule else schedule['scenes']
+  if scenes is None:
+    return False
+  times = to_times(new_schedule.get('times', schedule['times']), scenes)
+  if times is None:
+    return False
+  offset = new_schedule.get('utc_offset_min', schedule['utc_offset_min'])
+  if not isinstance(offset, int):
+    return False
+  schedule['utc_offset_min'] = min(max(offset, -720), 840)
+  schedule['scenes'] = scenes
+  schedule['times'] = times
+  _entries = [(_minute(t['at']), t['scene'] or None) for t in times]
+  return True
+
+def load():
+  try:
+    with open("schedule.json") as f:
+      return update(json.load(f))
+  except:
+    return False
+
+def to_json(s):
+  """ copy of s with hex colors in the scenes """
+  s = s.copy()
+  s['scenes'] = {name: config.to_json(s['scenes'][name]) for name in s['scenes']}
+  return s
+
+def write():
+  s = to_json(schedule)
+  try:
+    with open("schedule.json", "w") as f:
+      f.write(json.dumps(s))
+  except:
+    pass
+  return s
+
+def scene_config(name):
+  """ the base config with the scene's keys over it """
+  c = config.config.copy()
+  if name is not None:
+    c.update(schedule['scenes'].get(name, {}))
+  return c
+
+def lookup(s):
+  """ the scene at s seconds into the day, the next one and the seconds until it """
+  if not _entries:
+    return None, None, 0
+  m = s // 60
+  # before the first time of the day the last one from yesterday still holds
+  current = _entries[-1]
+  following = _entries[0]
+  for e in _entries:
+    if e[0] <= m:
+      current = e
+    else:
+      following = e
+      break
+  wait = (following[0] * 60 - s) % 86400
+  return current[1], following[1], wait or 86400
+
+class Timetable(object):
+  """
+  Switches leds to the scheduled scene; poll() at least once a second.
+  clock is anything with time(), the time module on the device.
+  """
+
+  def __init__(self, leds, clock=time):
+    self.leds = leds
+    self.clock = clock
+    self.active = None
+    self.switches = 0
+    self._version = 0
+    # (scene, version, leds.prepare() result) for the scene coming up
+    self._prepared = None
+
+  def seconds(self):
+    """ seconds into the local day """
+    return (int(self.clock.time()) + schedule['utc_offset_min'] * 60) % 86400
+
+  def changed(self):
+    """ the config or the schedule changed, publish the scene again and build the next one afresh """
+    self._version += 1
+    self._prepared = None
+    self.active = lookup(self.seconds())[0]
+    self.leds.publish(scene_config(self.active))
+
+  def poll(self):
+    current, following, wait = lookup(self.seconds())
+    if current != self.active:
+      p = self._prepared
+      if p is not None and p[0] == current and p[1] == self._version:
+        self.leds.publish(prepared=p[2])
+      else:
+        self.leds.publish(scene_config(current))
+      self.active = current
+      self._prepared = None
+      self.switches += 1
+    elif following != current and wait <= _prepare_s and self._prepared is None:
+      self._prepared = (following, self._version, self.leds.prepare(scene_config(following)))
+
+  def metrics(self):
+    current, following, wait = lookup(self.seconds())
+    return {
+      'active': self.active,
+      'next': following,
+      'next_in_s': wait if _entries else None,
+      'switches': self.switches,
+      'prepared': self._prepared[0] if self._prepared is not None else None,
+    }
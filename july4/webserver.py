@@ -1,5 +1,6 @@
 from micropyserver import MicroPyServer, static_files, Request, Response
 import config
+import scenes
 
 version = {
   'app': 'pico-led-micropython',
@@ -8,28 +9,60 @@ version = {
 
 def get_config(req:Request, res:Response):
   """ GET /api/v1/config """
-  c = config.config.copy()
-  c['colors'] = config.to_hex_colors(c['colors'])
-  res.send(c)
+  res.send(config.to_json(config.config))
 
-def post_config(req:Request, res:Response):
+def post_config(req:Request, res:Response, leds=None, timetable=None):
   """ POST /api/v1/config """
   if config.update(req.json()):
+    if timetable is not None:
+      timetable.changed()
+    elif leds is not None:
+      leds.publish(config.config)
     c = config.write()
     res.send(c)
   else:
     get_config(req, res)
 
-def start(port=80, ip='localhost', load_config=True, leds=None):
+def get_schedule(req:Request, res:Response, timetable=None):
+  """ GET /api/v1/schedule """
+  s = scenes.to_json(scenes.schedule)
+  if timetable is not None:
+    s['status'] = timetable.metrics()
+  res.send(s)
+
+def post_schedule(req:Request, res:Response, timetable=None):
+  """ POST /api/v1/schedule """
+  if scenes.update(req.json()):
+    scenes.write()
+    if timetable is not None:
+      timetable.changed()
+  get_schedule(req, res, timetable)
+
+def get_metrics(req:Request, res:Response, leds=None, server=None):
+  """ GET /api/v1/metrics """
+  m = leds.metrics() if leds is not None else {}
+  m['server'] = server.metrics()
+  res.send(m)
+
+def _server(port, ip, load_config, leds, timetable):
   if load_config:
     config.load()
+    scenes.load()
   server = MicroPyServer(ip=ip, port=port)
   server.add_route("/api/v1/version", lambda req,res: res.send(version))
   server.add_route("/api/v1/config", get_config)
-  server.add_route("/api/v1/config", post_config, method="POST")
-  if leds is not None:
-    server.add_route("/api/v1/metrics", lambda req,res: res.send({'avgtick_ms':leds.avgtick}))
+  server.add_route("/api/v1/config", lambda req,res: post_config(req, res, leds, timetable), method="POST")
+  server.add_route("/api/v1/schedule", lambda req,res: get_schedule(req, res, timetable))
+  server.add_route("/api/v1/schedule", lambda req,res: post_schedule(req, res, timetable), method="POST")
+  server.add_route("/api/v1/metrics", lambda req,res: get_metrics(req, res, leds, server))
+  if timetable is not None:
+    timetable.changed()
+    server.on_idle(timetable.poll)
   server.on_not_found(static_files(basedir='public'))
+  return server
+
+def start(port=80, ip='localhost', load_config=True, leds=None, timetable=None):
+  server = _server(port, ip, load_config, leds, timetable)
   try:
     server.start()
   except KeyboardInterrupt:
@@ -37,6 +70,17 @@ def start(port=80, ip='localhost', load_config=True, leds=None):
   finally:
     server.stop()
 
+async def serve(port=80, ip='localhost', load_config=True, leds=None, timetable=None, loop_leds=False, max_connections=4):
+  """ start() on asyncio, with loop_leds the LED loop runs as a task beside it instead of in a thread """
+  import asyncio
+  server = _server(port, ip, load_config, leds, timetable)
+  if loop_leds:
+    asyncio.create_task(leds.aloop())
+  try:
+    await server.serve(max_connections)
+  finally:
+    server.stop()
+
 if __name__ == "__main__":
   start(3000)
 
@@ -0,0 +1,37 @@
+"""
+Host side stand-ins for running the LED engine on CPython.
+
+  import sim
+  sim.install()
+  sys.path.insert(0, 'xmas')
+  import leds
+
+install() makes machine, neopixel, rp2, network, ntptime and micropython
+importable, adds the MicroPython ticks/sleep functions to time and
+print_exception to sys. CPython's own _thread already behaves like the
+MicroPython one, so it is left alone. Frames written by the stand-in
+strips go to the sinks in sim.sink.
+"""
+import builtins
+import importlib
+import sys
+import traceback
+
+from sim import clock
+
+_modules = ('machine', 'neopixel', 'rp2', 'network', 'ntptime', 'micropython')
+
+def install():
+  for name in _modules:
+    if name not in sys.modules:
+      sys.modules[name] = importlib.import_module('sim.' + name)
+  # leds.py uses @micropython.native without importing micropython
+  builtins.micropython = sys.modules['micropython']
+  clock.patch_time()
+  if not hasattr(sys, 'print_exception'):
+    sys.print_exception = lambda e, file=None: traceback.print_exception(type(e), e, e.__traceback__, file=file)
+
+def app_path(app='xmas'):
+  """ directory of one of the apps, to put on sys.path """
+  import os
+  return os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), app)
@@ -0,0 +1,69 @@
+"""
+Run an app's LED engine on the host.
+
+  python3 -m sim xmas --frames 50 --term
+  python3 -m sim july4 --web 3000 --term
+"""
+import argparse
+import json
+import os
+import sys
+
+import sim
+from sim import sink
+
+def main():
+  parser = argparse.ArgumentParser(prog='python3 -m sim')
+  parser.add_argument('app', nargs='?', default='xmas')
+  parser.add_argument('--frames', type=int, default=100, help='frames to run without --web')
+  parser.add_argument('--nleds', type=int, help='override the strip length')
+  parser.add_argument('--term', action='store_true', help='draw frames in the terminal')
+  parser.add_argument('--ppm', help='save the frames as rows of a PPM image')
+  parser.add_argument('--web', type=int, metavar='PORT', help='also serve the web api on PORT')
+  parser.add_argument('--asyncio', action='store_true', help='with --web, one asyncio loop instead of a thread')
+  args = parser.parse_args()
+
+  sim.install()
+  path = sim.app_path(args.app)
+  sys.path.insert(0, path)
+  os.chdir(path)
+  import config
+  import leds
+  import scenes
+
+  config.load()
+  scenes.load()
+  if args.nleds:
+    config.config['nleds'] = args.nleds
+  if args.term:
+    sink.sinks.append(sink.Terminal())
+  image = sink.Image(args.ppm) if args.ppm else None
+  if image:
+    sink.sinks.append(image)
+
+  l = leds.Leds(config.config)
+  try:
+    if args.web:
+      import webserver
+      if args.asyncio:
+        import asyncio
+        asyncio.run(webserver.serve(args.web, load_config=False, leds=l, timetable=scenes.Timetable(l), loop_leds=True))
+      else:
+        l.start()
+        webserver.start(args.web, load_config=False, leds=l, timetable=scenes.Timetable(l))
+    else:
+      s = l.scheduler
+      for i in range(args.frames):
+        s.wait(l.snap.period_ms, l.snap.policy)
+        l.tick()
+        l._update_avgtick(s.done(l.snap.period_ms))
+  except KeyboardInterrupt:
+    pass
+  finally:
+    l.stop()
+    if image:
+      image.save()
+  print(json.dumps(l.metrics()))
+
+if __name__ == "__main__":
+  main()
@@ -0,0 +1,64 @@
+import time
+
+# MicroPython ticks wrap at 2**30
+_period = 1 << 30
+
+def ticks_add(ticks, delta):
+  return (ticks + delta) % _period
+
+def ticks_diff(a, b):
+  return ((a - b + _period // 2) % _period) - _period // 2
+
+def ticks_ms():
+  return (time.monotonic_ns() // 1000000) % _period
+
+def ticks_us():
+  return (time.monotonic_ns() // 1000) % _period
+
+def sleep_ms(ms):
+  if ms > 0:
+    time.sleep(ms / 1000)
+
+def sleep_us(us):
+  if us > 0:
+    time.sleep(us / 1000000)
+
+def patch_time():
+  """ give the time module the MicroPython ticks and sleep functions """
+  for f in (ticks_add, ticks_diff, ticks_ms, ticks_us, sleep_ms, sleep_us):
+    if not hasattr(time, f.__name__):
+      setattr(time, f.__name__, f)
+
+class FakeClock(object):
+  """
+  Clock that only moves when slept on or advanced, for driving
+  Scheduler, Profiler and Leds deterministically. Starts just before
+  the wrap so wraparound bugs show up. time() is the wall clock, epoch
+  seconds at start_ms plus the time advanced since.
+  """
+  ticks_add = staticmethod(ticks_add)
+  ticks_diff = staticmethod(ticks_diff)
+
+  def __init__(self, start_ms=_period - 1000, epoch=0):
+    self.us = start_ms * 1000
+    self._epoch_us = epoch * 1000000 - self.us
+
+  def time(self):
+    return (self._epoch_us + self.us) // 1000000
+
+  def ticks_ms(self):
+    return (self.us // 1000) % _period
+
+  def ticks_us(self):
+    return self.us % _period
+
+  def advance(self, ms):
+    self.us += int(ms * 1000)
+
+  def sleep_ms(self, ms):
+    if ms > 0:
+      self.advance(ms)
+
+  def sleep_us(self, us):
+    if us > 0:
+      self.us += us
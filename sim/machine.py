@@ -0,0 +1,30 @@
+class Pin(object):
+  IN = 0
+  OUT = 1
+  OPEN_DRAIN = 2
+  PULL_UP = 1
+  PULL_DOWN = 2
+
+  def __init__(self, id, mode=-1, pull=-1, value=None):
+    self.id = id
+    self._value = value or 0
+
+  def __repr__(self):
+    return 'Pin(%s)' % self.id
+
+  def value(self, v=None):
+    if v is None:
+      return self._value
+    self._value = v
+
+  def init(self, *args, **kwargs):
+    pass
+
+def freq(hz=None):
+  return 125000000
+
+def unique_id():
+  return b'\x00sim\x00\x00\x00\x00'
+
+def reset():
+  raise SystemExit('machine.reset()')
@@ -0,0 +1,7 @@
+from sim.strip import Strip
+
+class NeoPixel(Strip):
+  """ neopixel.NeoPixel stand-in, write() blocks for the modelled wire time """
+
+  def __init__(self, pin, n, bpp=3, timing=1):
+    Strip.__init__(self, pin, n, bpp=bpp)
@@ -0,0 +1,32 @@
+STA_IF = 0
+AP_IF = 1
+
+class WLAN(object):
+  """ always connects, the ip is localhost """
+
+  def __init__(self, interface=STA_IF):
+    self._active = False
+    self._status = 0
+
+  def active(self, v=None):
+    if v is None:
+      return self._active
+    self._active = v
+
+  def connect(self, ssid=None, key=None):
+    self._status = 3
+
+  def disconnect(self):
+    self._status = 0
+
+  def status(self):
+    return self._status
+
+  def isconnected(self):
+    return self._status == 3
+
+  def config(self, *args, **kwargs):
+    pass
+
+  def ifconfig(self):
+    return ('127.0.0.1', '255.0.0.0', '127.0.0.1', '127.0.0.1')
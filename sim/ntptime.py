@@ -0,0 +1,5 @@
+host = 'pool.ntp.org'
+
+def settime():
+  """ the host clock is already set """
+  pass
@@ -0,0 +1,75 @@
+"""
+Frame sinks. Every frame a stand-in strip sends is passed to each
+callable in sinks as sink(strip, buf), buf in the strip's byte order.
+
+  sim.sink.sinks.append(sim.sink.Terminal())
+"""
+import sys
+
+sinks = []
+
+def emit(strip, buf):
+  for s in sinks:
+    s(strip, buf)
+
+def to_rgb(buf, order=(1, 0, 2, 3), bpp=3):
+  """ strip byte order to rgb byte triples """
+  n = len(buf) // bpp
+  rgb = bytearray(n * 3)
+  for i in range(n):
+    for k in range(3):
+      rgb[i * 3 + k] = buf[i * bpp + order[k]]
+  return rgb
+
+class Recorder(object):
+  """ keeps the last max_frames frames """
+
+  def __init__(self, max_frames=1000):
+    self.max_frames = max_frames
+    self.frames = []
+
+  def __call__(self, strip, buf):
+    self.frames.append(bytes(buf))
+    if len(self.frames) > self.max_frames:
+      del self.frames[0]
+
+class Terminal(object):
+  """ one line of 24 bit color blocks per frame, averaging pixels down to width """
+
+  def __init__(self, width=80, out=sys.stdout):
+    self.width = width
+    self.out = out
+
+  def __call__(self, strip, buf):
+    rgb = to_rgb(buf, getattr(strip, 'ORDER', (1, 0, 2, 3)))
+    n = len(rgb) // 3
+    cols = min(self.width, n)
+    line = []
+    for c in range(cols):
+      lo = c * n // cols
+      hi = max((c + 1) * n // cols, lo + 1)
+      r = sum(rgb[i * 3] for i in range(lo, hi)) // (hi - lo)
+      g = sum(rgb[i * 3 + 1] for i in range(lo, hi)) // (hi - lo)
+      b = sum(rgb[i * 3 + 2] for i in range(lo, hi)) // (hi - lo)
+      line.append('\x1b[48;2;%d;%d;%dm ' % (r, g, b))
+    self.out.write(''.join(line) + '\x1b[0m\n')
+    self.out.flush()
+
+class Image(object):
+  """ stacks frames as rows of a binary PPM, time runs down the image """
+
+  def __init__(self, path, max_frames=1000):
+    self.path = path
+    self.max_frames = max_frames
+    self.rows = []
+
+  def __call__(self, strip, buf):
+    if len(self.rows) < self.max_frames:
+      self.rows.append(to_rgb(buf, getattr(strip, 'ORDER', (1, 0, 2, 3))))
+
+  def save(self):
+    width = max(len(r) for r in self.rows) // 3 if self.rows else 0
+    with open(self.path, 'wb') as f:
+      f.write(b'P6\n%d %d\n255\n' % (width, len(self.rows)))
+      for r in self.rows:
+        f.write(r.ljust(width * 3, b'\0'))
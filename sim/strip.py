@@ -0,0 +1,77 @@
+import time
+
+from sim import sink
+
+# WS2812 wire time: 1.25us per bit, then the >280us latch
+_bit_us = 1.25
+_latch_us = 300
+
+class Strip(object):
+  """
+  Stand-in for neopixel.NeoPixel and ws2812.WS2812. Nothing is sent
+  anywhere: write() copies the frame into last and records when the
+  transfer would have started and ended. With pipeline set write()
+  returns straight away, like the DMA driver, otherwise it blocks for
+  the wire time, like NeoPixel. Each frame also goes to the sinks.
+  With wire unset no time is modelled at all.
+  """
+  ORDER = (1, 0, 2, 3)
+
+  def __init__(self, pin, n, sm=0, pipeline=0, bpp=3, clock=time.perf_counter, wire=True):
+    self.pin = pin
+    self.n = n
+    self.sm = sm
+    self.pipeline = pipeline
+    self.bpp = bpp
+    self.buf = bytearray(n * bpp)
+    self.last = bytearray(n * bpp)
+    self.clock = clock
+    self.wire = wire
+    self.frames = 0
+    self.writes = []
+    self._busy_until = 0
+
+  def __len__(self):
+    return self.n
+
+  def __setitem__(self, i, v):
+    offset = i * self.bpp
+    for i in range(self.bpp):
+      self.buf[offset + self.ORDER[i]] = v[i]
+
+  def __getitem__(self, i):
+    offset = i * self.bpp
+    return tuple(self.buf[offset + self.ORDER[i]] for i in range(self.bpp))
+
+  def fill(self, v):
+    for i in range(self.n):
+      self[i] = v
+
+  def wire_us(self):
+    if not self.wire:
+      return 0
+    return self.n * self.bpp * 8 * _bit_us + _latch_us
+
+  def busy(self):
+    return self.clock() < self._busy_until
+
+  def wait(self):
+    while self.busy():
+      pass
+
+  def write(self, buf=None):
+    self.wait()
+    self.last[:] = self.buf if buf is None else buf
+    self.frames += 1
+    sink.emit(self, self.last)
+    start = self.clock()
+    self._busy_until = start + self.wire_us() / 1e6
+    self.writes.append((start, self._busy_until))
+    if len(self.writes) > 100:
+      del self.writes[0]
+    if not self.pipeline:
+      self.wait()
+
+def driver(pin, n, sm=0, pipeline=0):
+  """ drop in for leds._driver, pass as Leds(config, driver=sim.strip.driver) """
+  return Strip(pin, n, sm, pipeline)
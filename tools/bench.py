@@ -0,0 +1,56 @@
+"""
+Run the app's bench.py on the host through the simulator, write the
+results as json and optionally compare them with an earlier run.
+
+usage: python3 tools/bench.py [--app xmas] [--out results.json] [--compare old.json]
+"""
+import argparse
+import json
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+import sim
+import sim.strip
+
+def compare(old, new, threshold):
+  """ print ops that got slower or allocate more, returns how many """
+  before = {(x['config'], x['nleds'], x['op']): x for x in old['results']}
+  worse = 0
+  for x in new['results']:
+    o = before.get((x['config'], x['nleds'], x['op']))
+    if o is None:
+      continue
+    slower = o['us'] > 0 and x['us'] > o['us'] * (1 + threshold)
+    if slower or x['alloc'] > o['alloc']:
+      worse += 1
+      print('%-8s %6d %-6s %10.1f -> %10.1f us %8d -> %8d bytes' % (
+        x['config'], x['nleds'], x['op'], o['us'], x['us'], o['alloc'], x['alloc']))
+  return worse
+
+def main():
+  parser = argparse.ArgumentParser()
+  parser.add_argument('--app', default='xmas')
+  parser.add_argument('--reps', type=int, default=50)
+  parser.add_argument('--out', help='write the results here as json')
+  parser.add_argument('--compare', help='results json from an earlier run')
+  parser.add_argument('--threshold', type=float, default=0.2, help='slowdown that counts as a regression')
+  args = parser.parse_args()
+
+  sim.install()
+  sys.path.insert(0, sim.app_path(args.app))
+  import bench
+
+  r = bench.run(reps=args.reps, driver=sim.strip.driver)
+  bench.report(r)
+  if args.out:
+    with open(args.out, 'w') as f:
+      json.dump(r, f, indent=1)
+  if args.compare:
+    with open(args.compare) as f:
+      worse = compare(json.load(f), r, args.threshold)
+    print('%d regressions' % worse)
+    sys.exit(1 if worse else 0)
+
+if __name__ == "__main__":
+  main()
@@ -0,0 +1,37 @@
+"""
+Compare the old per-byte fade loop against leds._lut8 on the host.
+
+usage: python3 tools/bench_fade.py [app-dir]
+"""
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+import sim
+sim.install()
+sys.path.insert(0, sim.app_path(sys.argv[1] if len(sys.argv) > 1 else 'xmas'))
+import leds
+
+def fade_loop(buf, n):
+  for i in range(n):
+    buf[i] >>= 1
+
+def run(fn, n, reps):
+  buf = bytearray(range(256)) * (n // 256 + 1)
+  start = time.perf_counter()
+  for _ in range(reps):
+    fn(buf)
+  return (time.perf_counter() - start) * 1000 / reps
+
+def main():
+  lut = leds.decay_lut(128)
+  print('%8s %12s %12s %8s' % ('nleds', 'loop_ms', 'lut_ms', 'speedup'))
+  for nleds in (300, 1200, 5000):
+    n = nleds * 3
+    old = run(lambda b: fade_loop(b, n), n, 100)
+    new = run(lambda b: leds._lut8(b, lut, n), n, 100)
+    print('%8d %12.3f %12.3f %7.1fx' % (nleds, old, new, old / new))
+
+if __name__ == "__main__":
+  main()
@@ -0,0 +1,68 @@
+"""
+Count the sends and bytes each kind of response takes against a fake
+socket, and time them. Heads and bodies that fit one TCP segment must go
+out in one send, larger ones in two (head, then body). Exits non-zero if
+a response takes more.
+
+usage: python3 tools/bench_response.py [--app xmas] [--n 2000]
+"""
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+import sim
+
+class FakeSocket(object):
+  """ counts sendall calls and bytes, keeps nothing """
+
+  def __init__(self):
+    self.calls = 0
+    self.bytes = 0
+
+  def sendall(self, data):
+    self.calls += 1
+    self.bytes += len(data)
+
+def responses(config):
+  """ name and a function sending that response """
+  conf = config.to_json(config.config)
+  return [
+    ('201 no body', lambda res: res.send()),
+    ('version json', lambda res: res.send({'app': 'pico-led-micropython', 'version': '1.0.0'})),
+    ('config json', lambda res: res.send(conf)),
+    ('405 with Allow', lambda res: res.header('Allow', 'GET, POST').error(code=405)),
+    ('4 KB file', lambda res: res.send(b'x' * 4096, content_type='text/html')),
+    ('32 KB file', lambda res: res.send(b'x' * 32768, content_type='image/png')),
+  ]
+
+def main():
+  parser = argparse.ArgumentParser()
+  parser.add_argument('--app', default='xmas')
+  parser.add_argument('--n', type=int, default=2000)
+  args = parser.parse_args()
+  sim.install()
+  sys.path.insert(0, sim.app_path(args.app))
+  import config
+  import micropyserver
+  server = micropyserver.MicroPyServer()
+  failed = False
+  print('%-16s %6s %7s %9s' % ('response', 'sends', 'bytes', 'us'))
+  for name, respond in responses(config):
+    server._connect = FakeSocket()
+    start = time.perf_counter()
+    for _ in range(args.n):
+      res = micropyserver.Response(server, keep_alive=True)
+      respond(res)
+    us = (time.perf_counter() - start) * 1e6 / args.n
+    calls = server._connect.calls / args.n
+    size = server._connect.bytes // args.n
+    expected = 1 if size <= micropyserver._out_size else 2
+    print('%-16s %6.1f %7d %9.1f%s' % (name, calls, size, us, '' if calls <= expected else '  FAIL'))
+    failed = failed or calls > expected
+  server._connect = None
+  sys.exit(1 if failed else 0)
+
+if __name__ == "__main__":
+  main()
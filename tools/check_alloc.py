@@ -0,0 +1,189 @@
+"""
+Check that a steady state Leds.tick() allocates nothing, per config:
+
+  built     objects built while ticking: every opcode the app's code runs
+            that builds a tuple, list, dict, set, slice, string or
+            function, and everything the app's code allocates that is
+            still alive at the next line (a new buffer, a list append)
+  retained  memory left allocated by the app's code after a thousand ticks
+
+Either fails the check. CPython allocates where MicroPython does not, so
+those are left out: boxed ints (MicroPython keeps them small up to 2**30),
+frame objects, for loop iterators (on the stack in MicroPython) and
+anything under the pure Python stand-ins for the viper kernels, which
+cannot allocate on the device. CPython keeps free lists of tuples and
+lists, so those are found by their opcodes rather than by tracemalloc.
+
+On the device run with 'profile': 1 and look at profile.alloc_bytes in
+/api/v1/metrics, which counts gc.mem_alloc() growth during ticks.
+
+usage: python3 tools/check_alloc.py [--app xmas] [--ticks 1000] [--traced 20]
+"""
+import argparse
+import collections
+import dis
+import linecache
+import os
+import sys
+import tracemalloc
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+import sim
+from checks import check, done
+from sim.strip import Strip
+
+configs = {
+  'default': {'colors': [(255, 0, 0), (0, 255, 0)], 'crawl': 1, 'fade': 1, 'random': 5},
+  'pattern': {'colors': [(255, 0, 0), (0, 0, 255)], 'spread': 3, 'space_between': 2, 'crawl': -2, 'fade': 0, 'random': 0},
+  'pipeline': {'colors': [(255, 255, 255)], 'crawl': 1, 'fade': 1, 'random': 10, 'max_ma': 3000, 'pipeline': 1},
+  'segments': {'colors': [(0, 0, 255)], 'crawl': 1, 'fade': 1, 'random': 5,
+    'segments': [{'pin': 0, 'nleds': 300}, {'pin': 1, 'nleds': 200, 'crawl': -1}]},
+  'transition': {'colors': [(255, 0, 0), (0, 0, 255)], 'crawl': 1, 'fade': 1, 'random': 5, 'transition_ms': 10000},
+}
+
+# the viper kernels and their CPython stand-ins, by module
+_kernels = {
+  'leds': ('_lut8', '_scale8', '_sum8', '_blend8', '_copy', '_rotate', '_sparkle'),
+  'frames': ('_delta', '_undelta'),
+  'ddp': ('_put',),
+}
+
+# opcodes that put a new object on the heap
+_builds = {
+  'BUILD_TUPLE', 'BUILD_LIST', 'BUILD_MAP', 'BUILD_SET', 'BUILD_SLICE', 'BUILD_STRING',
+  'BUILD_CONST_KEY_MAP', 'LIST_EXTEND', 'LIST_TO_TUPLE', 'SET_UPDATE', 'DICT_UPDATE',
+  'DICT_MERGE', 'MAKE_FUNCTION', 'FORMAT_VALUE', 'CALL_FUNCTION_EX',
+}
+
+# tracemalloc sizes of CPython ints below 2**60
+_int_sizes = (28, 32)
+
+def driver(pin, n, sm=0, pipeline=0):
+  return Strip(pin, n, sm, pipeline, wire=False)
+
+def warm(leds, cfg):
+  """ Leds for cfg after its first ticks and a couple of config changes """
+  cfg = dict(cfg)
+  cfg.setdefault('nleds', 300)
+  l = leds.Leds(cfg, driver=driver)
+  for i in range(50):
+    # config changes, the last one leaves a transition running
+    if i in (10, 49):
+      l.publish(dict(cfg, colors=cfg['colors'][::-1]))
+    l.tick()
+  return l
+
+class Built(object):
+  """ sys.settrace tracer collecting what the app's code builds, by line """
+
+  def __init__(self, app, kernels):
+    self.app = app
+    self.kernels = kernels
+    # (file, first line, last line) of each kernel
+    self.spans = [(k.co_filename, k.co_firstlineno, max(n for _, _, n in k.co_lines() if n)) for k in kernels]
+    self.found = collections.Counter()
+    self._ops = {}
+    self._traced = 0
+
+  def call(self, frame, event, arg):
+    co = frame.f_code
+    if not co.co_filename.startswith(self.app) or self._in_kernel(frame):
+      return None
+    frame.f_trace_opcodes = True
+    return self.step
+
+  def _in_kernel(self, frame):
+    while frame is not None:
+      if frame.f_code in self.kernels:
+        return True
+      frame = frame.f_back
+    return False
+
+  def step(self, frame, event, arg):
+    if event == 'opcode':
+      op = self._opnames(frame.f_code).get(frame.f_lasti)
+      if op in _builds:
+        self._add(frame.f_code.co_filename, frame.f_lineno, op)
+    elif event == 'line':
+      # nothing new can be alive if the traced total has not grown
+      if tracemalloc.get_traced_memory()[0] > self._traced:
+        for t in tracemalloc.take_snapshot().traces:
+          if self._counts(t):
+            f = t.traceback[-1]
+            self._add(f.filename, f.lineno, '%d bytes' % t.size)
+        self._traced = tracemalloc.get_traced_memory()[0]
+    return self.step
+
+  def _opnames(self, co):
+    if co not in self._ops:
+      self._ops[co] = {i.offset: i.opname for i in dis.get_instructions(co)}
+    return self._ops[co]
+
+  def _counts(self, trace):
+    """ True if the app allocated this and MicroPython would have too """
+    f = trace.traceback[-1]
+    if not f.filename.startswith(self.app) or trace.size in _int_sizes:
+      return False
+    for frame in trace.traceback:
+      for name, first, last in self.spans:
+        if frame.filename == name and first <= frame.lineno <= last:
+          return False
+    line = linecache.getline(f.filename, f.lineno).strip()
+    # a frame object made for the tracer, or a loop's iterator
+    return not (line.startswith(('def ', 'async def ', '@')) or (line.startswith('for ') and trace.size == 48))
+
+  def _add(self, filename, lineno, what):
+    self.found['%s:%d %s' % (os.path.basename(filename), lineno, what)] += 1
+
+def built(l, ticks, app, kernels):
+  """ what the app built over ticks, traced """
+  b = Built(app, kernels)
+  tracemalloc.start(4)
+  sys.settrace(b.call)
+  try:
+    for _ in range(ticks):
+      l.tick()
+  finally:
+    sys.settrace(None)
+    tracemalloc.stop()
+  return b.found
+
+def retained(l, ticks, app):
+  """ bytes still allocated by the app's own code after ticks """
+  # only count allocations made in the app's files, not the stand-in strip
+  only_app = [tracemalloc.Filter(True, os.path.join(app, '*'))]
+  tracemalloc.start()
+  before = tracemalloc.take_snapshot().filter_traces(only_app)
+  for _ in range(ticks):
+    l.tick()
+  after = tracemalloc.take_snapshot().filter_traces(only_app)
+  tracemalloc.stop()
+  return sum(d.size_diff for d in after.compare_to(before, 'filename'))
+
+def main():
+  parser = argparse.ArgumentParser()
+  parser.add_argument('--app', default='xmas')
+  parser.add_argument('--ticks', type=int, default=1000)
+  parser.add_argument('--traced', type=int, default=20, help='ticks to trace for built objects')
+  args = parser.parse_args()
+
+  sim.install()
+  app = sim.app_path(args.app)
+  sys.path.insert(0, app)
+  import leds
+  modules = {name: __import__(name) for name in _kernels}
+  kernels = {getattr(modules[m], name).__code__ for m in _kernels for name in _kernels[m]}
+
+  for name, cfg in configs.items():
+    l = warm(leds, cfg)
+    found = built(l, args.traced, app, kernels)
+    kept = retained(l, args.ticks, app)
+    print('%-10s %4d built over %d ticks, %6d bytes kept over %d' % (name, sum(found.values()), args.traced, kept, args.ticks))
+    for what, count in sorted(found.items()):
+      print('  %-50s x%d' % (what, count))
+    # a counter holding a boxed int keeps one alive, a real leak is far more than a byte a tick
+    check(name + ': nothing built or kept', not found and kept < args.ticks)
+  done()
+
+if __name__ == "__main__":
+  main()
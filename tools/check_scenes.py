@@ -0,0 +1,115 @@
+"""
+Run a day of the scene schedule on a fake clock: check each scene
+switches in on time, that its snapshot was built ahead of the switch
+and that the switch itself builds nothing. Then change the strips
+under it and check the LED thread puts the new ones up, and turn
+transitions off in the middle of one and check segments keep to one
+max_ma between them.
+
+usage: python3 tools/check_scenes.py [--app xmas]
+"""
+import argparse
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+import sim
+from checks import check, done
+from sim.clock import FakeClock
+from sim.strip import Strip
+
+schedule = {
+  'utc_offset_min': -420,
+  'scenes': {
+    'evening': {'colors': ['#ff0000', '#ffffff'], 'gradient': 'hsv', 'spread': 10},
+    'dim': {'brightness': 40},
+    'off': {'brightness': 0, 'crawl': 0, 'fade': 0, 'random': 0},
+  },
+  'times': [{'at': '17:30', 'scene': 'evening'}, {'at': '0:00', 'scene': 'dim'}, {'at': '02:00', 'scene': 'off'}],
+}
+
+# local midnight 2024-06-01 at utc-7
+_midnight = 1717225200
+
+def main():
+  parser = argparse.ArgumentParser()
+  parser.add_argument('--app', default='xmas')
+  args = parser.parse_args()
+
+  sim.install()
+  sys.path.insert(0, sim.app_path(args.app))
+  import config
+  import leds
+  import scenes
+
+  config.config.update({'nleds': 300, 'colors': [(0, 0, 255)], 'crawl': 1, 'fade': 1, 'random': 5})
+  check('schedule accepted', scenes.update(schedule))
+  check('times sorted and normalised', [t['at'] for t in scenes.schedule['times']] == ['00:00', '02:00', '17:30'])
+  scenes.update({'times': [{'at': '25:00', 'scene': 'dim'}, {'at': '03:00', 'scene': 'nope'}]})
+  check('bad times and unknown scenes dropped', scenes.schedule['times'] == [])
+  scenes.update({'scenes': {'rec': {'brightness': 10, 'record': 'a.led', 'segments': [{'pin': 1, 'nleds': 10, 'record': 'b.led'}]}}})
+  check('scenes leave out record', scenes.schedule['scenes']['rec'] == {'brightness': 10, 'segments': [{'pin': 1, 'nleds': 10}]})
+  scenes.update(schedule)
+
+  # start at noon: 'off' is still on from 2am
+  clock = FakeClock(epoch=_midnight + 12 * 3600)
+  l = leds.Leds(config.config, clock=clock, driver=lambda pin, n, sm=0, pipeline=0: Strip(pin, n, sm, pipeline, wire=False))
+  t = scenes.Timetable(l, clock)
+  t.changed()
+  l.tick()
+  check('noon is off', t.active == 'off' and l.snap.brightness == 0)
+
+  built = []
+  snapshot = leds.Snapshot
+  def counting(*a, **k):
+    built.append(clock.time())
+    return snapshot(*a, **k)
+  leds.Snapshot = counting
+
+  switches = []
+  for _ in range(24 * 3600):
+    before = t.active
+    n = len(built)
+    t.poll()
+    l.tick()
+    if t.active != before:
+      switches.append((t.seconds() // 60, t.active, len(built) - n, l.snap))
+    clock.advance(1000)
+  leds.Snapshot = snapshot
+
+  check('three switches', [s[1] for s in switches] == ['evening', 'dim', 'off'])
+  check('each on its minute', [s[0] for s in switches] == [17 * 60 + 30, 0, 120])
+  check('nothing built at a switch', all(s[2] == 0 for s in switches))
+  check('each scene built in the minute before', len(built) == 3 and
+    all(0 < (s[0] * 60 - (b + schedule['utc_offset_min'] * 60) % 86400) % 86400 <= 60 for s, b in zip(switches, built)))
+  check('evening is a gradient, dim is dim', switches[0][3].gradient == 'hsv' and switches[1][3].brightness == 40)
+  print(t.metrics())
+
+  # segments added, removed or resized are put up at the next tick
+  l.publish(dict(config.config, segments=[{'pin': 1, 'nleds': 100}, {'pin': 2, 'nleds': 50}]))
+  l.tick()
+  check('segments put up', l.leds is None and [s.leds.n for s in l.segments] == [100, 50])
+  check('each segment written', all(s.leds.frames for s in l.segments))
+  l.publish(dict(config.config, nleds=150))
+  l.tick()
+  check('back to one strip, resized', not l.segments and l.leds.n == 150 and l.leds.frames > 0)
+
+  l.publish(dict(config.config, nleds=150, transition_ms=2000))
+  l.tick()
+  clock.advance(500)
+  blending = l._blending
+  l.publish(dict(config.config, nleds=150, transition_ms=0))
+  l.tick()
+  l.tick()
+  check('transitions off mid blend ends it', blending and not l._blending)
+
+  white = dict(config.config, colors=[(255, 255, 255)], brightness=255, random=100, max_ma=1000,
+    segments=[{'pin': i, 'nleds': 100} for i in range(3)])
+  l.publish(white)
+  for _ in range(5):
+    l.tick()
+  check('segments share max_ma', 0 < l.metrics()['est_ma'] <= 1000)
+  done()
+
+if __name__ == "__main__":
+  main()
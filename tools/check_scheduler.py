@@ -0,0 +1,69 @@
+"""
+Drive the Scheduler on a fake clock across the ticks_ms wrap with one
+long frame in the middle, and check each policy's frame start times and
+its late, dropped and overrun counts.
+
+usage: python3 tools/check_scheduler.py [--app xmas]
+"""
+import argparse
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+import sim
+from checks import check, done
+from sim.clock import FakeClock
+
+_period_ms = 100
+
+# (policy, ms the long frame takes, frame starts in ms after the first, late, dropped, overruns)
+# frame 10 starts 1000ms in, at the wrap, and runs long; every other frame takes 10ms
+cases = (
+  # slots 11 and 12 dropped, frame 11 starts late, back on the grid at 1400
+  ('skip', 350, [1350, 1400, 1500], 1, 2, 1),
+  # frames 11 to 13 back to back, caught up by 1400
+  ('catch_up', 350, [1350, 1360, 1370, 1400, 1500], 3, 0, 1),
+  # the grid restarts at 1350
+  ('stretch', 350, [1350, 1450, 1550], 1, 0, 1),
+  # 5 periods behind is past _max_behind, so catch_up skips too
+  ('catch_up', 600, [1600, 1700, 1800], 1, 5, 1),
+)
+
+def run(scheduler, policy, long_ms, frames=16):
+  """ frame start times in ms after the first, and the scheduler's metrics """
+  clock = FakeClock()
+  s = scheduler.Scheduler(clock)
+  starts = []
+  first = None
+  for i in range(frames):
+    s.wait(_period_ms, policy)
+    if first is None:
+      first = s.start_ms
+    starts.append(clock.ticks_diff(s.start_ms, first))
+    clock.advance(long_ms if i == 10 else 10)
+    s.done(_period_ms)
+  # the wrap is where the ticks go back to small numbers
+  wrapped = s.start_ms < first
+  return starts, s.metrics(), wrapped
+
+def main():
+  parser = argparse.ArgumentParser()
+  parser.add_argument('--app', default='xmas')
+  args = parser.parse_args()
+
+  sim.install()
+  sys.path.insert(0, sim.app_path(args.app))
+  import scheduler
+
+  for policy, long_ms, after, late, dropped, overruns in cases:
+    starts, m, wrapped = run(scheduler, policy, long_ms)
+    name = '%s, %dms frame' % (policy, long_ms)
+    check(name + ': ran across the wrap', wrapped)
+    check(name + ': on the grid before', starts[:11] == [i * _period_ms for i in range(11)])
+    check(name + ': starts after', starts[11:11 + len(after)] == after)
+    check(name + ': late %d dropped %d overruns %d' % (late, dropped, overruns),
+      (m['late'], m['dropped'], m['overruns']) == (late, dropped, overruns))
+  done()
+
+if __name__ == "__main__":
+  main()
@@ -0,0 +1,283 @@
+"""
+Check the web server against stalled and surplus clients, for kept alive
+and pipelined connections, requests arriving in tiny pieces and routing: the
+asyncio server with the LED loop as a task beside it, then the blocking
+one. Exits non-zero if a check fails.
+
+usage: python3 tools/check_server.py [--app xmas] [--port 3081]
+"""
+import argparse
+import asyncio
+import json
+import os
+import socket
+import sys
+import tempfile
+import threading
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+import sim
+from checks import check, done
+from sim.strip import Strip
+
+_timeout_s = 1
+_max_connections = 2
+_keep_alive_s = 1
+_max_requests = 3
+
+async def get(port, path='/api/v1/version'):
+  reader, writer = await asyncio.open_connection('127.0.0.1', port)
+  writer.write(b'GET ' + path.encode() + b' HTTP/1.0\r\n\r\n')
+  await writer.drain()
+  data = await reader.read()
+  writer.close()
+  return data
+
+async def read_response(reader):
+  """ status line and body of one response, by its Content-Length """
+  head = await reader.readuntil(b'\r\n\r\n')
+  length = 0
+  for line in head.split(b'\r\n'):
+    if line.lower().startswith(b'content-length:'):
+      length = int(line[15:])
+  body = await reader.readexactly(length)
+  return head.split(b'\r\n', 1)[0], body
+
+def request(path='/api/v1/version', extra=b''):
+  return b'GET ' + path.encode() + b' HTTP/1.1\r\nHost: x\r\n' + extra + b'\r\n'
+
+def connect(port):
+  s = socket.create_connection(('127.0.0.1', port), timeout=_timeout_s * 3)
+  # every send its own segment
+  s.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+  return s
+
+def send_slowly(s, data, size):
+  for i in range(0, len(data), size):
+    s.sendall(data[i:i + size])
+    time.sleep(0.002)
+
+def responses(s, count):
+  """ status lines and bodies of up to count responses, fewer if the server closes """
+  f = s.makefile('rb')
+  out = []
+  for _ in range(count):
+    line = f.readline()
+    if not line:
+      break
+    length = 0
+    while True:
+      h = f.readline()
+      if h in (b'\r\n', b''):
+        break
+      if h.lower().startswith(b'content-length:'):
+        length = int(h[15:])
+    out.append((line.rstrip(), f.read(length)))
+  return out
+
+def check_reader(port, name):
+  """ requests in pieces, bodies by Content-Length, refusals """
+  s = connect(port)
+  send_slowly(s, request(), 1)
+  r = responses(s, 1)
+  check(name + ': head a byte at a time', len(r) == 1 and r[0][0] == b'HTTP/1.1 200 Ok')
+  body = json.dumps({'brightness': 77}).encode()
+  post = b'POST /api/v1/config HTTP/1.1\r\nContent-Type: application/json\r\nContent-Length: %d\r\n\r\n' % len(body)
+  send_slowly(s, post + body + request(), 3)
+  r = responses(s, 2)
+  check(name + ': body 3 bytes at a time', len(r) == 2 and json.loads(r[0][1]).get('brightness') == 77 and b'version' in r[1][1])
+  s.close()
+
+  s = connect(port)
+  s.sendall(b'POST /api/v1/config HTTP/1.1\r\nContent-Length: 100000\r\n\r\n')
+  r = responses(s, 2)
+  check(name + ': oversized body refused with 413', len(r) == 1 and r[0][0].startswith(b'HTTP/1.1 413'))
+  s.close()
+
+  s = connect(port)
+  s.sendall(b'GET / HTTP/1.1\r\nX-Pad: ' + b'x' * 3000 + b'\r\n\r\n')
+  r = responses(s, 2)
+  check(name + ': oversized head refused with 431', len(r) == 1 and r[0][0].startswith(b'HTTP/1.1 431'))
+  s.close()
+
+  # the largest head and body the buffer holds, then a head a byte over
+  body = json.dumps({'brightness': 78}).encode().ljust(4096)
+  post = b'POST /api/v1/config HTTP/1.1\r\nContent-Length: 4096\r\nX-Pad: '
+  for pad, status, what in ((2048, b'HTTP/1.1 200', 'accepted'), (2049, b'HTTP/1.1 431', 'refused with 431')):
+    s = connect(port)
+    s.sendall(post + b'x' * (pad - len(post) - 4) + b'\r\n\r\n' + body)
+    r = responses(s, 2)
+    check(name + ': %d byte head and full body %s' % (pad, what), len(r) == 1 and r[0][0].startswith(status))
+    s.close()
+
+def check_routes(port):
+  """ exact and {name} routes, 405 for a path with other methods """
+  s = connect(port)
+  s.sendall(request('/api/v1/echo/abc-1') + request('/api/v1/echo/abc/def') + b'POST /api/v1/version HTTP/1.1\r\nConnection: close\r\n\r\n')
+  data = b''
+  while True:
+    chunk = s.recv(4096)
+    if not chunk:
+      break
+    data += chunk
+  s.close()
+  replies = data.split(b'HTTP/1.1 ')[1:]
+  check('route parameter captured', len(replies) == 3 and replies[0].endswith(b'{"name": "abc-1"}'))
+  check('parameter matches one segment', len(replies) == 3 and replies[1].startswith(b'404'))
+  check('other method gets 405 with Allow', len(replies) == 3 and replies[2].startswith(b'405') and b'\r\nAllow: GET\r\n' in replies[2])
+
+def check_pipelined(port, count=20):
+  """ many small responses on one connection, each its own body """
+  s = connect(port)
+  s.sendall(b''.join(request('/api/v1/echo/n%d' % i) for i in range(count)))
+  r = responses(s, count)
+  s.close()
+  check('%d pipelined responses intact' % count, [body for line, body in r] == [b'{"name": "n%d"}' % i for i in range(count)])
+
+async def check_keep_alive(port):
+  reader, writer = await asyncio.open_connection('127.0.0.1', port)
+  writer.write(request())
+  first = await read_response(reader)
+  writer.write(request())
+  second = await read_response(reader)
+  check('second request on a kept connection', first[0] == second[0] == b'HTTP/1.1 200 Ok' and first[1] == second[1])
+
+  # the third is the last this connection may carry
+  writer.write(request() + request())
+  await read_response(reader)
+  eof = await asyncio.wait_for(reader.read(), _timeout_s)
+  check('closed after max_requests', eof == b'')
+  writer.close()
+
+  reader, writer = await asyncio.open_connection('127.0.0.1', port)
+  writer.write(request() + request('/api/v1/config') + request('/api/v1/version', b'Connection: close\r\n'))
+  replies = [await read_response(reader) for _ in range(3)]
+  eof = await asyncio.wait_for(reader.read(), _timeout_s)
+  check('pipelined requests answered in order', b'version' in replies[0][1] and b'colors' in replies[1][1] and b'version' in replies[2][1])
+  check('Connection: close honoured', eof == b'')
+  writer.close()
+
+  reader, writer = await asyncio.open_connection('127.0.0.1', port)
+  writer.write(request())
+  await read_response(reader)
+  start = time.perf_counter()
+  eof = await asyncio.wait_for(reader.read(), _keep_alive_s * 3)
+  check('idle kept connection closed', eof == b'' and time.perf_counter() - start >= _keep_alive_s * 0.9)
+  writer.close()
+
+async def check_asyncio(webserver, leds, port):
+  l = leds.Leds({'nleds': 300, 'period_ms': 20, 'colors': [(255, 0, 0)], 'crawl': 1, 'random': 5}, driver=lambda pin, n, sm=0, pipeline=0: Strip(pin, n, sm, pipeline, wire=False))
+  server = webserver._server(port, '127.0.0.1', False, l, None)
+  server._timeout_s = _timeout_s
+  server._keep_alive_s = _keep_alive_s
+  server._max_requests = _max_requests
+  server.add_route('/api/v1/echo/{name}', lambda req, res: res.send(req.params))
+  asyncio.create_task(l.aloop())
+  task = asyncio.create_task(server.serve(_max_connections))
+  await asyncio.sleep(0.2)
+
+  stalled = await asyncio.open_connection('127.0.0.1', port)
+  start = time.perf_counter()
+  data = await get(port)
+  check('served beside a stalled client', data.startswith(b'HTTP/1.1 200') and time.perf_counter() - start < _timeout_s)
+
+  more = await asyncio.open_connection('127.0.0.1', port)
+  await asyncio.sleep(0.1)
+  data = await get(port)
+  check('over the cap gets 503', data.startswith(b'HTTP/1.1 503'))
+  reader, writer = await asyncio.open_connection('127.0.0.1', port)
+  writer.write(b'POST /api/v1/config HTTP/1.1\r\nContent-Length: 4096\r\n\r\n' + b' ' * 4096)
+  try:
+    status = (await read_response(reader))[0]
+  except (ConnectionError, asyncio.IncompleteReadError):
+    status = b''
+  check('503 reaches a client with a body unread', status.startswith(b'HTTP/1.1 503'))
+  writer.close()
+
+  eof = await asyncio.wait_for(stalled[0].read(), _timeout_s * 3)
+  check('stalled client timed out and closed', eof == b'')
+  await more[0].read()
+  data = await get(port)
+  check('served again once they are gone', data.startswith(b'HTTP/1.1 200'))
+
+  frames = l.scheduler.frames
+  await asyncio.sleep(0.5)
+  check('LED task kept ticking', l.scheduler.frames - frames >= 10)
+
+  await check_keep_alive(port)
+  await asyncio.to_thread(check_reader, port, 'asyncio')
+  await asyncio.to_thread(check_routes, port)
+  server._max_requests = 32
+  await asyncio.to_thread(check_pipelined, port)
+  server._max_requests = _max_requests
+  data = await get(port, '/api/v1/metrics')
+  check('metrics served', b'frames_written' in data)
+  m = json.loads(data.split(b'\r\n\r\n', 1)[1])['server']
+  # the two keep-alive connections, the pieces, the routes and the pipelined one
+  check('reused connections counted once each', m['connections_reused'] == 5 and m['connections_new'] >= 14)
+
+  l.stop()
+  server.stop()
+  await asyncio.sleep(0.1)
+  task.cancel()
+
+def check_blocking(webserver, port):
+  server = webserver._server(port, '127.0.0.1', False, None, None)
+  server._timeout_s = _timeout_s
+  server._keep_alive_s = _keep_alive_s
+  idles = []
+  server.on_idle(lambda: idles.append(time.perf_counter()), 0.2)
+  threading.Thread(target=server.start, daemon=True).start()
+  time.sleep(0.2)
+  stalled = socket.create_connection(('127.0.0.1', port))
+  start = time.perf_counter()
+  s = socket.create_connection(('127.0.0.1', port))
+  s.sendall(b'GET /api/v1/version HTTP/1.0\r\n\r\n')
+  data = s.recv(4096)
+  elapsed = time.perf_counter() - start
+  check('blocking server gets past a stalled client', data.startswith(b'HTTP/1.1 200') and elapsed < _timeout_s * 3)
+  stalled.close()
+  s.close()
+
+  # an idle kept connection gives way to the next client
+  kept = socket.create_connection(('127.0.0.1', port))
+  kept.sendall(request())
+  kept.recv(4096)
+  start = time.perf_counter()
+  s = socket.create_connection(('127.0.0.1', port))
+  s.sendall(request('/api/v1/version', b'Connection: close\r\n'))
+  data = s.recv(4096)
+  elapsed = time.perf_counter() - start
+  check('blocking server keeps a connection', data.startswith(b'HTTP/1.1 200'))
+  check('idle kept connection gives way', elapsed < _keep_alive_s / 2)
+  kept.close()
+  s.close()
+
+  # a kept connection holds the loop, the idle handler still runs every interval
+  kept = socket.create_connection(('127.0.0.1', port))
+  kept.sendall(request())
+  kept.recv(4096)
+  before = len(idles)
+  time.sleep(_keep_alive_s * 0.8)
+  check('idle handler runs while a connection is kept', len(idles) - before >= 2)
+  kept.close()
+  check_reader(port, 'blocking')
+
+def main():
+  parser = argparse.ArgumentParser()
+  parser.add_argument('--app', default='xmas')
+  parser.add_argument('--port', type=int, default=3081)
+  args = parser.parse_args()
+  sim.install()
+  sys.path.insert(0, sim.app_path(args.app))
+  import leds
+  import webserver
+  # POST /api/v1/config writes config.json here
+  os.chdir(tempfile.mkdtemp())
+  asyncio.run(check_asyncio(webserver, leds, args.port))
+  check_blocking(webserver, args.port + 1)
+  done()
+
+if __name__ == "__main__":
+  main()
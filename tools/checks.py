@@ -0,0 +1,17 @@
+"""
+The ok/FAIL lines the check scripts print, and their exit status.
+"""
+import sys
+
+failures = []
+
+def check(name, ok):
+  """ print name with ok or FAIL, keeping the failures for done() """
+  print('%-50s %s' % (name, 'ok' if ok else 'FAIL'))
+  if not ok:
+    failures.append(name)
+  return ok
+
+def done():
+  """ exit non-zero if any check failed """
+  sys.exit(1 if failures else 0)
@@ -0,0 +1,174 @@
+"""
+Send a test pattern to a DDP receiver (an app with 'udp_port' set), or
+check the receiver on the host against a local sender.
+
+  python3 tools/ddp_send.py 192.168.1.50 --nleds 300 --fps 40
+  python3 tools/ddp_send.py 127.0.0.1 --port 4048 --drop 0.02 --reorder 0.02
+  python3 tools/ddp_send.py --selftest [--app xmas]
+
+--drop and --reorder lose or swap that fraction of packets so the
+receiver's dropped and out_of_order counts can be checked against the
+sender's. --selftest runs an app's Leds with a receiver on a local
+port, sends frames with a known number of lost and swapped packets and
+exits non-zero if the strip or the counts are wrong.
+"""
+import argparse
+import colorsys
+import os
+import random
+import socket
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+from checks import check, done
+
+_VERSION_1 = 0x40
+_PUSH = 0x01
+# RGB, 8 bits per channel
+_RGB8 = 0x0b
+_max_data = 1440
+
+def packets(frame, seq):
+  """ one frame of rgb bytes as DDP packets, returns them and the next sequence number """
+  out = []
+  for offset in range(0, len(frame), _max_data):
+    data = frame[offset:offset + _max_data]
+    push = offset + _max_data >= len(frame)
+    header = bytes((_VERSION_1 | (_PUSH if push else 0), seq, _RGB8, 1)) + offset.to_bytes(4, 'big') + len(data).to_bytes(2, 'big')
+    out.append(header + data)
+    seq = seq % 15 + 1
+  return out, seq
+
+def rainbow(n, t):
+  """ a moving rainbow, rgb bytes """
+  frame = bytearray(n * 3)
+  for i in range(n):
+    r, g, b = colorsys.hsv_to_rgb(((i / n) + t) % 1.0, 1, 1)
+    frame[i * 3:i * 3 + 3] = bytes((int(r * 255), int(g * 255), int(b * 255)))
+  return frame
+
+def send(args):
+  sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+  seq = 1
+  sent = dropped = swapped = 0
+  start = time.perf_counter()
+  frame_no = 0
+  try:
+    while not args.frames or frame_no < args.frames:
+      pkts, seq = packets(rainbow(args.nleds, frame_no / 100), seq)
+      i = 0
+      while i < len(pkts):
+        if random.random() < args.reorder and i + 1 < len(pkts):
+          sock.sendto(pkts[i + 1], (args.host, args.port))
+          sock.sendto(pkts[i], (args.host, args.port))
+          sent += 2
+          swapped += 1
+          i += 2
+          continue
+        if random.random() < args.drop:
+          dropped += 1
+        else:
+          sock.sendto(pkts[i], (args.host, args.port))
+          sent += 1
+        i += 1
+      frame_no += 1
+      time.sleep(max(0, start + frame_no / args.fps - time.perf_counter()))
+  except KeyboardInterrupt:
+    pass
+  elapsed = time.perf_counter() - start
+  print('%d frames, %d packets (%.0f/s), %d dropped, %d swapped' % (frame_no, sent, sent / elapsed, dropped, swapped))
+
+def selftest(args):
+  import sim
+  from sim.strip import Strip
+  sim.install()
+  sys.path.insert(0, sim.app_path(args.app))
+  import leds
+
+  nleds = 1000
+  driver = lambda pin, n, sm=0, pipeline=0: Strip(pin, n, sm, pipeline, wire=False)
+  # half brightness, so the frames shown are the ones sent through the output table
+  l = leds.Leds({'nleds': nleds, 'colors': [], 'crawl': 0, 'fade': 0, 'random': 0, 'brightness': 128, 'udp_port': args.port}, driver=driver)
+  lut = l.snap.output_lut
+  sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+  dest = ('127.0.0.1', args.port)
+  def tick_until_quiet():
+    for _ in range(20):
+      l.tick()
+      time.sleep(0.005)
+
+  # whole frames arrive and land in strip order
+  seq = 1
+  for t in range(5):
+    frame = rainbow(nleds, t / 10)
+    pkts, seq = packets(frame, seq)
+    for p in pkts:
+      sock.sendto(p, dest)
+    tick_until_quiet()
+    check('frame %d matches' % t, bytes(l.leds.last) == bytes(_to_strip(frame.translate(lut), l.leds)))
+  r = l.receiver
+  check('frames counted', r.frames == 5)
+  check('nothing dropped or out of order', r.dropped == 0 and r.out_of_order == 0)
+
+  # one packet lost: counted, the frame still pushes
+  pkts, seq = packets(rainbow(nleds, 0.5), seq)
+  for p in pkts[:1] + pkts[2:]:
+    sock.sendto(p, dest)
+  tick_until_quiet()
+  check('lost packet counted', r.dropped == 1)
+
+  # two packets swapped: the late one is stale and dropped
+  pkts, seq = packets(rainbow(nleds, 0.6), seq)
+  for p in pkts[:1] + [pkts[2], pkts[1]] + pkts[3:]:
+    sock.sendto(p, dest)
+  tick_until_quiet()
+  check('late packet counted', r.out_of_order == 1)
+
+  # unpushed data is not shown
+  written = l.frames_written
+  pkts, seq = packets(rainbow(nleds, 0.7), seq)
+  for p in pkts[:-1]:
+    sock.sendto(p, dest)
+  tick_until_quiet()
+  check('no frame without push', l.frames_written == written)
+
+  sock.sendto(b'\x00' * 4, dest)
+  tick_until_quiet()
+  check('short packet counted as bad', r.bad == 1)
+
+  # an offset past the strip, one that is negative as a 32 bit int too
+  frames = r.frames
+  for offset in (nleds * 3, 1 << 31):
+    sock.sendto(bytes((_VERSION_1 | _PUSH, 0, _RGB8, 1)) + offset.to_bytes(4, 'big') + b'\x00\x03' + b'\xff' * 3, dest)
+  tick_until_quiet()
+  check('offsets past the strip counted as bad', r.bad == 3 and r.frames == frames)
+  print(r.metrics())
+  l._close()
+  done()
+
+def _to_strip(rgb, strip):
+  buf = bytearray(len(rgb))
+  for k in range(3):
+    buf[strip.ORDER[k]::3] = rgb[k::3]
+  return buf
+
+def main():
+  parser = argparse.ArgumentParser()
+  parser.add_argument('host', nargs='?', default='127.0.0.1')
+  parser.add_argument('--port', type=int, default=4048)
+  parser.add_argument('--nleds', type=int, default=300)
+  parser.add_argument('--fps', type=float, default=40)
+  parser.add_argument('--frames', type=int, default=0, help='0 sends until interrupted')
+  parser.add_argument('--drop', type=float, default=0, help='fraction of packets to lose')
+  parser.add_argument('--reorder', type=float, default=0, help='fraction of packets to swap with the next')
+  parser.add_argument('--selftest', action='store_true')
+  parser.add_argument('--app', default='xmas')
+  args = parser.parse_args()
+  if args.selftest:
+    selftest(args)
+  else:
+    send(args)
+
+if __name__ == "__main__":
+  main()
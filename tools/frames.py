@@ -0,0 +1,180 @@
+"""
+Build and inspect recorded shows (the format is in frames.py in the apps).
+Copy a built file to the device next to the app and set 'play' to its name.
+
+  python3 tools/frames.py build show.led --app xmas --frames 600
+  python3 tools/frames.py build show.led --config show.json --nleds 300
+  python3 tools/frames.py build show.led --ppm show.ppm
+  python3 tools/frames.py info show.led
+  python3 tools/frames.py play show.led --term
+
+build renders frames with the app's LED engine, or takes them from the
+rows of a binary PPM image (one row per frame, as sim --ppm writes them).
+info reports the compression ratio and how fast the frames decode here.
+"""
+import argparse
+import json
+import os
+import struct
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+import sim
+from sim import sink
+from sim.strip import Strip
+
+def _load(app):
+  sim.install()
+  sys.path.insert(0, sim.app_path(app))
+  import frames
+  return frames
+
+def _driver(pin, n, sm=0, pipeline=0):
+  return Strip(pin, n, sm, pipeline, wire=False)
+
+def read_ppm(path):
+  """ width and the rows of a binary PPM """
+  with open(path, 'rb') as f:
+    data = f.read()
+  fields = []
+  i = 0
+  while len(fields) < 4:
+    while data[i:i + 1].isspace():
+      i += 1
+    if data[i:i + 1] == b'#':
+      i = data.index(b'\n', i)
+      continue
+    j = i
+    while not data[j:j + 1].isspace():
+      j += 1
+    fields.append(data[i:j])
+    i = j
+  if fields[0] != b'P6' or fields[3] != b'255':
+    raise ValueError('not an 8 bit binary PPM: ' + path)
+  width, height = int(fields[1]), int(fields[2])
+  i += 1
+  return width, [data[i + r * width * 3:i + (r + 1) * width * 3] for r in range(height)]
+
+def from_rgb(rgb, order=Strip.ORDER, bpp=3):
+  """ rgb byte triples to strip byte order """
+  n = len(rgb) // 3
+  buf = bytearray(n * bpp)
+  for k in range(3):
+    buf[order[k]::bpp] = rgb[k::3]
+  return buf
+
+def build(args):
+  frames = _load(args.app)
+  if args.ppm:
+    width, rows = read_ppm(args.ppm)
+    r = frames.Recorder(args.out, width, 3, args.period_ms or 250, args.keyframe)
+    for row in rows[:args.frames]:
+      r.add(from_rgb(row))
+    r.close()
+    return r
+  import config
+  import leds
+  path = args.config or os.path.join(sim.app_path(args.app), 'config.json')
+  with open(path) as f:
+    config.update(json.load(f))
+  cfg = config.config
+  if args.nleds:
+    cfg['nleds'] = args.nleds
+  if args.period_ms:
+    cfg['period_ms'] = args.period_ms
+  if cfg.get('segments'):
+    sys.exit('build records one strip, drop segments from the config')
+  cfg['play'] = cfg['record'] = ''
+  cfg['record_frames'] = args.frames
+  l = leds.Leds(cfg, driver=_driver)
+  r = l.recorder = frames.Recorder(args.out, l.leds.n, l.leds.bpp, l.snap.period_ms, args.keyframe)
+  while l.recorder is not None:
+    l.tick()
+  return r
+
+def stats(frames, path):
+  """ frame counts and sizes from the frame headers """
+  s = {'file': path, 'bytes': os.path.getsize(path), 'frames': 0, 'keyframes': 0}
+  with open(path, 'rb') as f:
+    magic, version, bpp, n, period_ms, keyframe = struct.unpack(frames._header, f.read(frames._header_size))
+    s.update(n=n, bpp=bpp, period_ms=period_ms, keyframe=keyframe)
+    while True:
+      h = f.read(frames._frame_size)
+      if len(h) < frames._frame_size:
+        break
+      kind, size = struct.unpack('<BH', h)
+      f.seek(size, 1)
+      s['frames'] += 1
+      s['keyframes'] += kind == frames.KEY
+  raw = s['frames'] * n * bpp
+  s['ratio'] = round(raw / s['bytes'], 2) if s['bytes'] else 0
+  return s
+
+def decode_fps(frames, path, loops=3):
+  p = frames.Player(path)
+  count = 0
+  start = time.perf_counter()
+  while p.loops < loops and p.next():
+    count += 1
+  elapsed = time.perf_counter() - start
+  p.close()
+  return round(count / elapsed, 1) if elapsed else 0
+
+def info(args):
+  frames = _load(args.app)
+  s = stats(frames, args.file)
+  s['decode_fps'] = decode_fps(frames, args.file)
+  s['show_fps'] = round(1000 / s['period_ms'], 1) if s['period_ms'] else 0
+  print('%(file)s: %(frames)d frames (%(keyframes)d keyframes) of %(n)d leds, %(bytes)d bytes' % s)
+  print('compression %(ratio).2fx, decodes at %(decode_fps).1f fps here, recorded at %(show_fps).1f fps' % s)
+  print(json.dumps(s))
+
+def play(args):
+  frames = _load(args.app)
+  if args.term:
+    sink.sinks.append(sink.Terminal())
+  image = sink.Image(args.ppm) if args.ppm else None
+  if image:
+    sink.sinks.append(image)
+  p = frames.Player(args.file)
+  strip = Strip(0, p.n, bpp=p.bpp, wire=False)
+  while p.next() and p.loops == 0:
+    strip.buf[:] = p.frame
+    strip.write()
+    if args.term:
+      time.sleep(p.period_ms / 1000)
+  p.close()
+  if image:
+    image.save()
+
+def main():
+  parser = argparse.ArgumentParser()
+  parser.add_argument('--app', default='xmas')
+  sub = parser.add_subparsers(dest='cmd', required=True)
+  b = sub.add_parser('build')
+  b.add_argument('out')
+  b.add_argument('--frames', type=int, default=600)
+  b.add_argument('--config', help='app config json, default the app\'s config.json')
+  b.add_argument('--nleds', type=int)
+  b.add_argument('--period-ms', type=int)
+  b.add_argument('--keyframe', type=int, default=100, help='frames between keyframes')
+  b.add_argument('--ppm', help='take the frames from the rows of this image')
+  i = sub.add_parser('info')
+  i.add_argument('file')
+  p = sub.add_parser('play')
+  p.add_argument('file')
+  p.add_argument('--term', action='store_true')
+  p.add_argument('--ppm')
+  args = parser.parse_args()
+  if args.cmd == 'build':
+    build(args)
+    args.file = args.out
+    info(args)
+  elif args.cmd == 'info':
+    info(args)
+  else:
+    play(args)
+
+if __name__ == "__main__":
+  main()
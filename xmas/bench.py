@@ -0,0 +1,91 @@
+"""
+Benchmark the LED engine: each effect and a full tick() at several strip
+sizes and configs, reporting time and bytes allocated per call.
+
+On the device (prints the report and a json line over serial):
+  ampy run bench.py
+On the host (through the simulator, see tools/bench.py):
+  python3 tools/bench.py --out results.json
+"""
+import gc
+import json
+import sys
+import time
+from leds import Leds
+
+sizes = (300, 1200, 5000)
+
+configs = {
+  'default': {'colors': [(255, 0, 0), (0, 255, 0), (255, 255, 255)], 'crawl': 1, 'fade': 1, 'random': 5},
+  'pattern': {'colors': [(255, 0, 0), (0, 0, 255)], 'spread': 4, 'space_between': 2, 'crawl': 3, 'fade': 0, 'random': 0},
+  'sparkle': {'colors': [(255, 127, 0), (0, 127, 255)], 'crawl': 0, 'fade': 1, 'decay': 200, 'random': 25},
+  'gradient': {'colors': [(255, 0, 0), (0, 255, 0), (0, 0, 255)], 'gradient': 'hsv', 'spread': 20, 'crawl': 1, 'fade': 0, 'random': 5},
+  'limited': {'colors': [(255, 255, 255)], 'crawl': 1, 'fade': 1, 'random': 10, 'max_ma': 5000},
+}
+
+ops = {
+  'fill': lambda l: l.fill(),
+  'fillr': lambda l: l.fillr(l.snap.random, l.snap.colors),
+  'crawl': lambda l: l.crawl(l.snap.crawl),
+  'fade': lambda l: l.fade(l.snap.fade),
+  'tick': lambda l: l.tick(),
+}
+
+try:
+  import tracemalloc
+except ImportError:
+  tracemalloc = None
+
+def _measure(fn, l, reps):
+  """ us per call and bytes allocated per call """
+  fn(l)
+  if tracemalloc is not None:
+    # CPython has no running total, take the largest transient growth of a call
+    tracemalloc.start()
+    alloc = 0
+    t = 0
+    for _ in range(reps):
+      tracemalloc.reset_peak()
+      base = tracemalloc.get_traced_memory()[0]
+      start = time.ticks_us()
+      fn(l)
+      t += time.ticks_diff(time.ticks_us(), start)
+      alloc = max(alloc, tracemalloc.get_traced_memory()[1] - base)
+    tracemalloc.stop()
+    return t / reps, alloc
+  gc.collect()
+  gc.disable()
+  try:
+    before = gc.mem_alloc()
+    start = time.ticks_us()
+    for _ in range(reps):
+      fn(l)
+    t = time.ticks_diff(time.ticks_us(), start)
+    alloc = gc.mem_alloc() - before
+  finally:
+    gc.enable()
+  return t / reps, alloc // reps
+
+def run(sizes=sizes, configs=configs, reps=50, driver=None):
+  results = []
+  for name in configs:
+    for n in sizes:
+      cfg = dict(configs[name])
+      cfg['nleds'] = n
+      l = Leds(cfg) if driver is None else Leds(cfg, driver=driver)
+      for op in ops:
+        us, alloc = _measure(ops[op], l, reps)
+        results.append({'config': name, 'nleds': n, 'op': op, 'us': round(us, 1), 'alloc': alloc})
+      del l
+      gc.collect()
+  return {'impl': sys.implementation.name, 'platform': sys.platform, 'reps': reps, 'results': results}
+
+def report(r, out=sys.stdout):
+  out.write('%-8s %6s %-6s %10s %8s\n' % ('config', 'nleds', 'op', 'us', 'alloc'))
+  for x in r['results']:
+    out.write('%-8s %6d %-6s %10.1f %8d\n' % (x['config'], x['nleds'], x['op'], x['us'], x['alloc']))
+
+if __name__ == "__main__":
+  r = run()
+  report(r)
+  print(json.dumps(r))
@@ -0,0 +1,213 @@
+"""
+Recorded shows: frames kept as keyframes and XOR/RLE deltas in a file,
+played back from flash one frame at a time.
+
+File layout, little endian:
+  header  b'LEDF' version:u8 bpp:u8 n:u16 period_ms:u16 keyframe:u16
+  frames  kind:u8 size:u16 then size bytes, the first one a KEY
+A KEY frame is the raw n * bpp bytes in the strip's byte order. A DELTA
+is the frame XORed with the one before it, stored as runs of skip:u8
+count:u8 followed by count bytes to XOR in, so the unchanged parts of a
+frame cost nothing.
+"""
+import struct
+import sys
+
+MAGIC = b'LEDF'
+VERSION = 1
+KEY = 0
+DELTA = 1
+
+_header = '<4sBBHHH'
+_header_size = struct.calcsize(_header)
+_frame_size = 3
+
+if sys.implementation.name == 'micropython':
+  def _readinto(f, buf, n):
+    # stream readinto takes a byte count, no slice to allocate
+    return f.readinto(buf, n) or 0
+else:
+  def _readinto(f, buf, n):
+    return f.readinto(memoryview(buf)[:n]) or 0
+
+try:
+  @micropython.viper
+  def _delta(prev, cur, out, n:int, limit:int) -> int:
+    # encode cur against prev into out and make prev cur, -1 if over limit
+    p = ptr8(prev)
+    c = ptr8(cur)
+    o = ptr8(out)
+    i = 0
+    m = 0
+    while i < n:
+      skip = 0
+      while i < n and skip < 255 and p[i] == c[i]:
+        skip += 1
+        i += 1
+      if i >= n:
+        break
+      if m + 2 > limit:
+        return -1
+      h = m
+      m += 2
+      count = 0
+      while i < n and count < 255 and p[i] != c[i]:
+        if m >= limit:
+          return -1
+        o[m] = p[i] ^ c[i]
+        p[i] = c[i]
+        m += 1
+        count += 1
+        i += 1
+      o[h] = skip
+      o[h + 1] = count
+    return m
+
+  @micropython.viper
+  def _undelta(buf, data, size:int, n:int) -> int:
+    # XOR the runs into buf, 0 if a run falls outside it
+    b = ptr8(buf)
+    d = ptr8(data)
+    i = 0
+    j = 0
+    while j + 1 < size:
+      i += d[j]
+      count = d[j + 1]
+      j += 2
+      if i + count > n or j + count > size:
+        return 0
+      for _ in range(count):
+        b[i] = b[i] ^ d[j]
+        i += 1
+        j += 1
+    return 1
+except (NameError, AttributeError):
+  # no viper emitter (CPython), XOR as big ints and find the runs with re
+  import re
+
+  def _delta(prev, cur, out, n, limit):
+    x = (int.from_bytes(prev[:n], 'little') ^ int.from_bytes(cur[:n], 'little')).to_bytes(n, 'little')
+    prev[:n] = cur[:n]
+    m = 0
+    i = 0
+    for run in re.finditer(b'[^\x00]+', x):
+      start, end = run.span()
+      while start - i > 255:
+        if m + 2 > limit:
+          return -1
+        out[m:m + 2] = bytes((255, 0))
+        m += 2
+        i += 255
+      while start < end:
+        count = min(end - start, 255)
+        if m + 2 + count > limit:
+          return -1
+        out[m:m + 2] = bytes((start - i, count))
+        out[m + 2:m + 2 + count] = x[start:start + count]
+        m += 2 + count
+        start += count
+        i = start
+    return m
+
+  def _undelta(buf, data, size, n):
+    i = 0
+    j = 0
+    while j + 1 < size:
+      i += data[j]
+      count = data[j + 1]
+      j += 2
+      if i + count > n or j + count > size:
+        return 0
+      x = int.from_bytes(buf[i:i + count], 'little') ^ int.from_bytes(data[j:j + count], 'little')
+      buf[i:i + count] = x.to_bytes(count, 'little')
+      i += count
+      j += count
+    return 1
+
+class Recorder(object):
+  """
+  Appends frames to a recording. Every keyframe'th frame is stored whole,
+  as is any frame whose delta would be no smaller.
+  """
+
+  def __init__(self, path, n, bpp=3, period_ms=250, keyframe=100):
+    self.path = path
+    self.size = n * bpp
+    self.keyframe = keyframe
+    self.prev = bytearray(self.size)
+    self.out = bytearray(self.size)
+    self._hdr = bytearray(_frame_size)
+    self.frames = 0
+    self.keyframes = 0
+    self.bytes = _header_size
+    self.f = open(path, 'wb')
+    self.f.write(struct.pack(_header, MAGIC, VERSION, bpp, n, period_ms, keyframe))
+
+  def add(self, buf):
+    m = _delta(self.prev, buf, self.out, self.size, self.size) if self.frames % self.keyframe else -1
+    if m < 0:
+      self.prev[:] = memoryview(buf)[:self.size]
+      self._write(KEY, self.prev, self.size)
+      self.keyframes += 1
+    else:
+      self._write(DELTA, self.out, m)
+    self.frames += 1
+
+  def _write(self, kind, data, size):
+    struct.pack_into('<BH', self._hdr, 0, kind, size)
+    self.f.write(self._hdr)
+    self.f.write(memoryview(data)[:size])
+    self.bytes += _frame_size + size
+
+  def close(self):
+    self.f.close()
+
+class Player(object):
+  """
+  Plays a recording from flash. next() reads one frame into the
+  preallocated frame buffer, going back to the start at the end of the
+  file; a frame cut short (power lost while recording) counts as the end.
+  """
+
+  def __init__(self, path):
+    self.path = path
+    self.f = open(path, 'rb')
+    try:
+      magic, version, self.bpp, self.n, self.period_ms, self.keyframe = struct.unpack(_header, self.f.read(_header_size))
+    except ValueError:
+      magic = version = None
+    if magic != MAGIC or version != VERSION:
+      self.f.close()
+      raise ValueError('not a recording: ' + path)
+    self.size = self.n * self.bpp
+    self.frame = bytearray(self.size)
+    self._data = bytearray(self.size)
+    self._hdr = bytearray(_frame_size)
+    self.frames = 0
+    self.loops = 0
+
+  def next(self):
+    """ the next frame into self.frame, False if there is none """
+    if not self._read():
+      self.f.seek(_header_size)
+      self.loops += 1
+      if not self._read():
+        return False
+    self.frames += 1
+    return True
+
+  def _read(self):
+    h = self._hdr
+    if _readinto(self.f, h, _frame_size) < _frame_size:
+      return False
+    size = h[1] | h[2] << 8
+    if size > self.size:
+      return False
+    if h[0] == KEY:
+      return size == self.size and _readinto(self.f, self.frame, size) == size
+    if _readinto(self.f, self._data, size) < size:
+      return False
+    return _undelta(self.frame, self._data, size, self.size) != 0
+
+  def close(self):
+    self.f.close()
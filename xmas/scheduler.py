@@ -0,0 +1,80 @@
+import time
+
+policies = ('skip', 'catch_up', 'stretch')
+
+# catch_up gives up and skips once it is this many periods behind
+_max_behind = 4
+
+class Scheduler(object):
+  """
+  Deadline based frame clock. Frame k is due at start + k * period_ms,
+  computed with ticks_add/ticks_diff so it survives ticks_ms wraparound.
+
+  When a frame is late the policy decides what happens to the clock:
+    skip     - drop the slots that were missed, stay on the original grid
+    catch_up - run late frames back to back until the clock is caught up
+    stretch  - restart the clock at the late frame, shifting the grid
+
+  clock is anything with ticks_ms, ticks_add, ticks_diff and sleep_ms,
+  the time module on the device or a fake clock on the host.
+  """
+
+  def __init__(self, clock=time):
+    self.clock = clock
+    self.frames = 0
+    self.late = 0
+    self.dropped = 0
+    self.overruns = 0
+    self.reset()
+
+  def reset(self):
+    """ start a new frame clock at the next wait() """
+    self.deadline = None
+    self.start_ms = None
+
+  def wait(self, period_ms, policy='skip'):
+    """ sleep until the next frame is due """
+    self.clock.sleep_ms(self.due(period_ms, policy))
+    self.begin()
+
+  def due(self, period_ms, policy='skip'):
+    """
+    move on to the next frame and return the ms until it is due, for a
+    caller that sleeps some other way (asyncio) and then calls begin()
+    """
+    c = self.clock
+    now = c.ticks_ms()
+    if self.deadline is None:
+      self.deadline = now
+    else:
+      self.deadline = c.ticks_add(self.deadline, period_ms)
+    behind = c.ticks_diff(now, self.deadline)
+    if behind > 0:
+      self.late += 1
+      if policy == 'stretch':
+        self.deadline = now
+      elif behind >= period_ms and (policy != 'catch_up' or behind >= _max_behind * period_ms):
+        n = behind // period_ms
+        self.dropped += n
+        self.deadline = c.ticks_add(self.deadline, n * period_ms)
+    self.frames += 1
+    return -behind if behind < 0 else 0
+
+  def begin(self):
+    """ the frame starts now """
+    self.start_ms = self.clock.ticks_ms()
+
+  def done(self, period_ms):
+    """ end the current frame, returns how long it took """
+    elapsed = self.clock.ticks_diff(self.clock.ticks_ms(), self.start_ms)
+    if elapsed > period_ms:
+      self.overruns += 1
+    return elapsed
+
+  def metrics(self):
+    return {
+      'frames': self.frames,
+      'late': self.late,
+      'dropped': self.dropped,
+      'overruns': self.overruns,
+    }
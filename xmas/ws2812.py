@@ -0,0 +1,88 @@
+import rp2
+import time
+
+# PIO0 and PIO1 register blocks, TXF0 is at offset 0x10
+_pio_base = (0x50200000, 0x50300000)
+
+@rp2.asm_pio(sideset_init=rp2.PIO.OUT_LOW, out_shiftdir=rp2.PIO.SHIFT_LEFT, autopull=True, pull_thresh=8)
+def _ws2812():
+  T1 = 2
+  T2 = 5
+  T3 = 3
+  wrap_target()
+  label("bitloop")
+  out(x, 1)               .side(0)    [T3 - 1]
+  jmp(not_x, "do_zero")   .side(1)    [T1 - 1]
+  jmp("bitloop")          .side(1)    [T2 - 1]
+  label("do_zero")
+  nop()                   .side(0)    [T2 - 1]
+  wrap()
+
+class WS2812(object):
+  """
+  NeoPixel compatible strip whose write() only starts the transfer: a DMA
+  channel feeds the bytes of the buffer to a PIO state machine, so the
+  CPU is free to render the next frame while this one goes out.
+
+  The DMA writes single bytes to the TX FIFO. The bus replicates a byte
+  across the 32 bit FIFO entry and the state machine shifts out the top
+  8 bits of each, so the buffer is sent as is in NeoPixel byte order.
+  """
+  ORDER = (1, 0, 2, 3)
+
+  def __init__(self, pin, n, bpp=3, sm=0):
+    self.pin = pin
+    self.n = n
+    self.bpp = bpp
+    self.buf = bytearray(n * bpp)
+    self._sm = rp2.StateMachine(sm, _ws2812, freq=8_000_000, sideset_base=pin)
+    self._sm.active(1)
+    self._dma = rp2.DMA()
+    self._fifo = _pio_base[sm // 4] + 0x10 + 4 * (sm % 4)
+    self._ctrl = self._dma.pack_ctrl(size=0, inc_write=False, treq_sel=(sm // 4) * 8 + sm % 4)
+
+  def __len__(self):
+    return self.n
+
+  def __setitem__(self, i, v):
+    offset = i * self.bpp
+    for i in range(self.bpp):
+      self.buf[offset + self.ORDER[i]] = v[i]
+
+  def __getitem__(self, i):
+    offset = i * self.bpp
+    return tuple(self.buf[offset + self.ORDER[i]] for i in range(self.bpp))
+
+  def fill(self, v):
+    b = self.buf
+    l = len(self.buf)
+    bpp = self.bpp
+    for i in range(bpp):
+      c = v[i]
+      j = self.ORDER[i]
+      while j < l:
+        b[j] = c
+        j += bpp
+
+  def busy(self):
+    return self._dma.active() or self._sm.tx_fifo() > 0
+
+  def wait(self):
+    """ block until the last frame is out and latched """
+    if not self.busy():
+      return
+    while self.busy():
+      pass
+    # the last byte is still in the shift register, then >280us low to latch
+    time.sleep_us(300)
+
+  def write(self, buf=None):
+    """ start sending buf (default self.buf) once the previous frame is done """
+    buf = self.buf if buf is None else buf
+    self.wait()
+    self._dma.config(read=buf, write=self._fifo, count=len(buf), ctrl=self._ctrl, trigger=True)
+
+  def deinit(self):
+    self.wait()
+    self._dma.close()
+    self._sm.active(0)